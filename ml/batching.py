@@ -0,0 +1,257 @@
+import asyncio
+import functools
+import itertools
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+from executor import ModelExecutor
+from handsign_backends import stage_latency
+from metrics import Counter, Histogram
+from utils import log_info
+
+
+class FrameDroppedError(Exception):
+    """Raised to the submitter of a frame or request dropped before inference (superseded, or its session disconnected)."""
+
+
+class QueueFullError(RuntimeError):
+    """Raised to the submitter of a new item when max_queue_depth items are already waiting for a batch."""
+
+
+class BatchScheduler:
+    """
+    Gathers pending items from all sessions and runs them through a batched
+    predict function as one call. A batch is flushed once it reaches
+    max_batch_size items or once its oldest item has waited max_wait_ms.
+    With an executor, batches run on its worker threads, at most one per worker
+    at a time; while all workers are busy new items keep joining the next batch.
+    Without an executor, batches run inline on the event loop.
+
+    With latest_wins, each session has at most one pending item: a newer item
+    from the same sid replaces the queued one, whose submitter gets
+    FrameDroppedError. Otherwise every submitted item is queued in arrival order.
+    Items already in a running batch are not affected, unless cancel_running is
+    set: then a newer item also drops its session's item from the running batch,
+    and predict_batch is called with cancelled=fn, fn(i) telling whether item i
+    has been dropped since, so the predict function can skip work on it.
+
+    At most max_queue_depth items wait for a batch (None for no limit); a new item
+    beyond that is rejected with QueueFullError instead of piling up. An item that
+    replaces its session's pending one is always accepted.
+
+    Subclasses name the model and the items they batch; metrics are exported
+    under the model's name.
+    """
+    model = 'model'           # Metric prefix
+    model_label = 'model'     # For log and metric descriptions
+    item = 'item'
+    latest_wins = True
+    cancel_running = False
+
+    def __init__(self, predict_batch: Callable[[list[Any]], list[Any]], executor: ModelExecutor | None = None,
+                 max_batch_size: int = 32, max_wait_ms: float = 3.0, max_queue_depth: int | None = None,
+                 verbose: bool = True):
+        self._predict_batch = predict_batch
+        self._executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_queue_depth = None if max_queue_depth is None else max(1, max_queue_depth)
+        self._verbose = verbose
+        # Pending entries in arrival order, keyed by sid (latest wins) or by sid and arrival number:
+        # key -> (sid, item, future, enqueued_at)
+        self._pending: OrderedDict[Any, tuple[str, Any, asyncio.Future, float]] = OrderedDict()
+        self._arrivals = itertools.count()
+        # With cancel_running: sid -> future of its item in a running batch
+        self._running: dict[str, asyncio.Future] = {}
+        # Items dropped per session since it connected
+        self._dropped: dict[str, int] = {}
+        self._has_pending: asyncio.Event | None = None
+        self._batch_full: asyncio.Event | None = None
+        self._worker: asyncio.Task | None = None
+        self._running_batches: set[asyncio.Task] = set()
+        self._free_workers: asyncio.Semaphore | None = None
+
+        self._batch_size_histogram = Histogram(
+            f'{self.model}_batch_size', f'Number of {self.item}s per batched {self.model_label} inference call',
+            [1, 2, 4, 8, 16, 32, 64, 128],
+        )
+        self._batch_wait_histogram = Histogram(
+            f'{self.model}_batch_wait_ms',
+            f'Time the oldest {self.item} in a batch waited before inference (ms)',
+            [0.5, 1, 2, 3, 5, 10, 25, 50, 100],
+        )
+        self._batches_total = Counter(f'{self.model}_batches_total',
+                                      f'Number of batched {self.model_label} inference calls')
+        self._dropped_total = Counter(
+            f'{self.model}_{self.item}s_dropped_total',
+            f'{self.item.capitalize()}s replaced by a newer {self.item} from the same session before '
+            f'{"their result was ready" if self.cancel_running else "inference started"}',
+        )
+        self._rejected_total = Counter(
+            f'{self.model}_{self.item}s_rejected_total',
+            f'{self.item.capitalize()}s rejected because the {self.model_label} queue was full',
+        )
+
+    def _ensure_started(self):
+        # Events and the worker task must be created inside the running event loop
+        if self._worker is None or self._worker.done():
+            self._has_pending = asyncio.Event()
+            self._batch_full = asyncio.Event()
+            if self._executor is not None:
+                self._free_workers = asyncio.Semaphore(self._executor.max_workers)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+            log_info(f"{self.model_label.capitalize()} batch scheduler started (max batch {self.max_batch_size}, "
+                     f"max wait {self.max_wait * 1000:g} ms, max queue {self.max_queue_depth})", self._verbose)
+
+    async def submit(self, sid: str, item: Any) -> Any:
+        """Queue one item for the next batch and wait for its result."""
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        previous = self._pending.get(sid) if self.latest_wins else None
+        if previous is not None:
+            # Replace the stale item but keep the session's place in line
+            _, _, stale_future, enqueued_at = previous
+            self._pending[sid] = (sid, item, future, enqueued_at)
+            self._drop(sid, stale_future)
+        else:
+            if self.max_queue_depth is not None and len(self._pending) >= self.max_queue_depth:
+                self._rejected_total.inc()
+                raise QueueFullError(f"{self.model_label.capitalize()} queue is full "
+                                     f"({len(self._pending)} {self.item}s waiting)")
+            key = sid if self.latest_wins else (sid, next(self._arrivals))
+            self._pending[key] = (sid, item, future, time.perf_counter())
+        running = self._running.pop(sid, None) if self.cancel_running else None
+        if running is not None and not running.done():
+            self._drop(sid, running)
+        self._has_pending.set()
+        if len(self._pending) >= self.max_batch_size:
+            self._batch_full.set()
+        return await future
+
+    def _drop(self, sid: str, future: asyncio.Future):
+        self._dropped[sid] = self._dropped.get(sid, 0) + 1
+        self._dropped_total.inc()
+        if not future.done():
+            future.set_exception(FrameDroppedError(f"{self.item.capitalize()} from {sid} superseded by a newer {self.item}"))
+
+    def dropped_items(self, sid: str) -> int:
+        """Number of items from this session dropped in favour of newer ones."""
+        return self._dropped.get(sid, 0)
+
+    def forget(self, sid: str) -> int:
+        """Discard any pending items and per-session state for a disconnected sid. Returns its drop count."""
+        futures = [self._pending.pop(key)[2] for key, entry in list(self._pending.items()) if entry[0] == sid]
+        futures.append(self._running.pop(sid, None))
+        for future in futures:
+            if future is not None and not future.done():
+                future.set_exception(FrameDroppedError(f"Session {sid} disconnected"))
+        return self._dropped.pop(sid, 0)
+
+    def _observe_queue_wait(self, seconds: float):
+        """Time one item spent queued; for subclasses that record it per item."""
+
+    def _take_batch(self) -> list[tuple]:
+        batch = []
+        while self._pending and len(batch) < self.max_batch_size:
+            _, (sid, item, future, enqueued_at) = self._pending.popitem(last=False)
+            if not future.done():  # Skip items whose handler has gone away
+                batch.append((sid, item, future, enqueued_at))
+        if not self._pending:
+            self._has_pending.clear()
+        if len(self._pending) < self.max_batch_size:
+            self._batch_full.clear()
+        return batch
+
+    async def _run(self):
+        while True:
+            await self._has_pending.wait()
+            # Give other sessions a short window to join this batch
+            if len(self._pending) < self.max_batch_size and self.max_wait > 0:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), self.max_wait)
+                except asyncio.TimeoutError:
+                    pass
+
+            if self._free_workers is not None:
+                await self._free_workers.acquire()
+            batch = self._take_batch()
+            if not batch:
+                if self._free_workers is not None:
+                    self._free_workers.release()
+                continue
+
+            now = time.perf_counter()
+            self._batch_wait_histogram.observe((now - batch[0][3]) * 1000)
+            for _, _, _, enqueued_at in batch:
+                self._observe_queue_wait(now - enqueued_at)
+            self._batch_size_histogram.observe(len(batch))
+            self._batches_total.inc()
+
+            if self._executor is None:
+                await self._execute(batch)
+            else:
+                # Keep collecting the next batch while this one runs on a worker
+                task = asyncio.get_running_loop().create_task(self._execute(batch))
+                self._running_batches.add(task)
+                task.add_done_callback(self._running_batches.discard)
+
+    async def _execute(self, batch: list[tuple]):
+        items = [item for _, item, _, _ in batch]
+        predict_batch = self._predict_batch
+        if self.cancel_running:
+            for sid, _, future, _ in batch:
+                self._running[sid] = future
+            # Read from the worker thread; a future only ever goes from pending to done
+            futures = [future for _, _, future, _ in batch]
+            predict_batch = functools.partial(self._predict_batch, cancelled=lambda i: futures[i].done())
+        try:
+            if self._executor is None:
+                results = predict_batch(items)
+            else:
+                results = await self._executor.run(predict_batch, items)
+        except Exception as e:
+            for _, _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            if self._free_workers is not None:
+                self._free_workers.release()
+            for sid, _, future, _ in batch:
+                if self._running.get(sid) is future:
+                    del self._running[sid]
+
+        # Route each result back to the handler waiting for it
+        for (_, _, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+class HandSignBatchScheduler(BatchScheduler):
+    """Hand sign frames, latest frame per session wins."""
+    model = 'handsign'
+    model_label = 'hand sign'
+    item = 'frame'
+    latest_wins = True
+
+    def dropped_frames(self, sid: str) -> int:
+        """Number of frames from this session dropped in favour of newer ones."""
+        return self.dropped_items(sid)
+
+    def _observe_queue_wait(self, seconds: float):
+        stage_latency['queue'].observe(seconds * 1e6)
+
+
+class AutoCompleteBatchScheduler(BatchScheduler):
+    """
+    Autocomplete requests, items being (text, sid). Requests that arrive within the
+    collection window share one padded language model pass (AutoCompleteModel.predict_batch).
+    Only a session's latest text matters: a newer request replaces its queued one and
+    cancels its running one.
+    """
+    model = 'autocomplete'
+    model_label = 'autocomplete'
+    item = 'request'
+    latest_wins = True
+    cancel_running = True
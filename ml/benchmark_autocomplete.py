@@ -0,0 +1,167 @@
+"""
+Compare the autocomplete language model backends (fp32 and dynamic int8) on CPU.
+
+Prompts are word windows sampled from the autocomplete corpus, keeping those that end in a
+complete word so every one of them reaches the language model. Each backend and thread
+count runs in its own process, so the reported memory belongs to that configuration only.
+
+The report lists, per backend and intra-op thread count:
+  - resident memory after loading and after the runs (weights are memory-mapped and only
+    count once touched), and the peak (int8 is quantized from the fp32 weights)
+  - per-prompt latency (one prompt per call, no session cache, as for a learner's first request)
+  - throughput with batches of --batch-size prompts (AutoCompleteModel.predict_batch)
+  - agreement with fp32 at the same thread count: same first suggestion, and the mean
+    overlap (intersection over union) of the suggestion lists
+
+Agreement is only meaningful in the deterministic rank mode (the default here).
+
+Usage:
+    python benchmark_autocomplete.py
+    python benchmark_autocomplete.py --threads 1 2 4 --prompts 300 --report autocomplete_report.md
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import re
+import resource
+import time
+
+import numpy as np
+from dotenv import load_dotenv
+
+from model_autocomplete import LM_BACKENDS, LM_MODES, AutoCompleteModel
+
+load_dotenv()
+
+
+def sample_prompts(corpus_path: str, count: int, seed: int) -> list[str]:
+    """count word windows of 3 to 12 words from the corpus (more than needed; see run_backend)."""
+    with open(corpus_path, "r", encoding="utf-8") as f:
+        words = re.findall(r'[a-z]+', f.read().lower())
+    rng = random.Random(seed)
+    prompts = []
+    for _ in range(count):
+        length = rng.randint(3, 12)
+        start = rng.randrange(max(1, len(words) - length))
+        prompts.append(" ".join(words[start:start + length]))
+    return prompts
+
+
+def _rss_mib() -> float:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+
+def run_backend(model_name: str | None, backend: str, threads: int, mode: str, prompts: list[str],
+                prompt_count: int, batch_size: int, seconds: float) -> dict:
+    """Load one backend in this process and measure it."""
+    model = AutoCompleteModel(backend=backend, threads=threads, **({'model_name': model_name} if model_name else {}))
+    model.lm_mode = mode
+    model.load()
+    loaded_rss = _rss_mib()
+
+    prompts = [prompt for prompt in prompts if model.is_word_complete(prompt.split()[-1])][:prompt_count]
+    model.predict_batch([(prompt, None) for prompt in prompts[:batch_size]])  # Warm up
+
+    suggestions, timings = [], []
+    for prompt in prompts:
+        start = time.perf_counter()
+        suggestions.append(model.predict(prompt).words)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    batches = [[(prompt, None) for prompt in prompts[i:i + batch_size]]
+               for i in range(0, len(prompts) - batch_size + 1, batch_size)] or [[(p, None) for p in prompts]]
+    answered, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        for batch in batches:
+            model.predict_batch(batch)
+            answered += len(batch)
+    throughput = answered / (time.perf_counter() - start)
+
+    return {
+        'backend': model.backend,
+        'threads': threads,
+        'loaded_rss_mib': loaded_rss,
+        'rss_mib': _rss_mib(),
+        'peak_rss_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,  # KiB on Linux
+        'p50_ms': float(np.percentile(timings, 50)),
+        'p95_ms': float(np.percentile(timings, 95)),
+        'throughput': throughput,
+        'prompts': prompts,
+        'suggestions': suggestions,
+    }
+
+
+def agreement(results: list[list[str]], reference: list[list[str]]) -> tuple[float, float]:
+    """(share of prompts with the same first suggestion, mean intersection over union of the lists)."""
+    first, overlap = [], []
+    for ours, theirs in zip(results, reference):
+        first.append(ours[:1] == theirs[:1])
+        union = set(ours) | set(theirs)
+        overlap.append(len(set(ours) & set(theirs)) / len(union) if union else 1.0)
+    return float(np.mean(first)), float(np.mean(overlap))
+
+
+def write_report(path: str, args, runs: list[dict]):
+    lines = [
+        "# Autocomplete language model backend report",
+        "",
+        f"Model: `{args.model or AutoCompleteModel().model_name}`, mode `{args.mode}`, "
+        f"{len(runs[0]['prompts'])} prompts from `{args.corpus}`. Latency: one prompt per call; "
+        f"throughput: batches of {args.batch_size} prompts.",
+        "",
+        "| Backend | Threads | RSS loaded (MiB) | RSS after runs (MiB) | Peak RSS (MiB) | p50 latency (ms) | "
+        "p95 latency (ms) | Throughput (prompts/s) | Same first suggestion as fp32 | Suggestion overlap with fp32 |",
+        "|---|---|---|---|---|---|---|---|---|---|",
+    ]
+    references = {run['threads']: run['suggestions'] for run in runs if run['backend'] == 'fp32'}
+    for run in runs:
+        reference = references.get(run['threads'], next(iter(references.values()), None))
+        if reference is None:
+            first, overlap = float('nan'), float('nan')
+        else:
+            first, overlap = agreement(run['suggestions'], reference)
+        lines.append(f"| {run['backend']} | {run['threads']} | {run['loaded_rss_mib']:.0f} | {run['rss_mib']:.0f} | "
+                     f"{run['peak_rss_mib']:.0f} | {run['p50_ms']:.2f} | {run['p95_ms']:.2f} | "
+                     f"{run['throughput']:.1f} | {first:.3f} | {overlap:.3f} |")
+    report = "\n".join(lines) + "\n"
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(report)
+    print(report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', help='Hugging Face model name or local path (default: the service model)')
+    parser.add_argument('--corpus', default=os.getenv("AUTOCOMPLETE_CORPUS_PATH", "big.txt"))
+    parser.add_argument('--backends', nargs='+', default=list(LM_BACKENDS), choices=LM_BACKENDS)
+    parser.add_argument('--threads', nargs='+', type=int, default=sorted({1, os.cpu_count() or 1}),
+                        help='Intra-op thread counts to compare')
+    parser.add_argument('--mode', default='rank', choices=LM_MODES)
+    parser.add_argument('--prompts', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=3.0, help='Duration of each throughput run')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--report', default='./autocomplete_backend_report.md')
+    args = parser.parse_args()
+
+    # Oversample: prompts ending in an incomplete word are skipped by every run alike
+    prompts = sample_prompts(args.corpus, args.prompts * 4, args.seed)
+    # fp32 first, so every other backend has its reference
+    backends = sorted(args.backends, key=lambda backend: backend != 'fp32')
+    context = multiprocessing.get_context('spawn')
+    runs = []
+    for threads in args.threads:
+        for backend in backends:
+            with context.Pool(1) as pool:
+                run = pool.apply(run_backend, (args.model, backend, threads, args.mode, prompts, args.prompts,
+                                               args.batch_size, args.seconds))
+            print(f"{backend}, {threads} threads: p50 {run['p50_ms']:.2f} ms, {run['throughput']:.1f} prompts/s, "
+                  f"RSS {run['rss_mib']:.0f} MiB")
+            runs.append(run)
+    write_report(args.report, args, runs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Check the compiled random forest against sklearn and compare their speed.
+
+The scaler + PCA + forest pipeline used by model_handsign_rf.py is loaded from the same
+paths as the service. Landmark frames from a CSV (landmark_{i}_{x,y,z} columns, as in the
+training data) are projected once, then fed to both RandomForestClassifier.predict_proba
+and CompiledForest.predict_proba. The run fails if any probability differs.
+
+The report lists per-frame latency (one frame per call, as the service sees it at low load)
+and batched throughput for both implementations.
+
+--self-check needs no model files or data: it fits small forests on synthetic landmark-like
+data and checks the compiled forest against sklearn on a batch, single rows and an empty batch.
+
+Usage:
+    python benchmark_forest.py --self-check
+    python benchmark_forest.py --csv heldout.csv
+    python benchmark_forest.py --csv heldout.csv --batch-size 64 --report forest_report.md
+"""
+import argparse
+import os
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from forest import CompiledForest
+from landmarks import FEATURE_COLUMNS, fold_scaler_and_pca
+
+load_dotenv()
+
+
+def load_pipeline(scaler_path: str, pca_path: str, model_path: str):
+    with open(scaler_path, 'rb') as f:
+        scaler = pickle.load(f)
+    with open(pca_path, 'rb') as f:
+        pca = pickle.load(f)
+    with open(model_path, 'rb') as f:
+        model = pickle.load(f)
+    return fold_scaler_and_pca(scaler, pca), model
+
+
+def check_parity(model, forest: CompiledForest, features: np.ndarray) -> int:
+    """Return the number of frames where the compiled forest disagrees with sklearn; 0 means identical output."""
+    expected = model.predict_proba(features)
+    actual = forest.predict_proba(features)
+    mismatched = np.any(expected != actual, axis=1)
+    if mismatched.any():
+        print(f"Largest probability difference: {np.abs(expected - actual).max():.3e}")
+    return int(mismatched.sum())
+
+
+def self_check(seed: int = 0):
+    """
+    Fit small forests on synthetic data and assert the compiled forest reproduces
+    RandomForestClassifier.predict_proba exactly. Raises AssertionError on any difference.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+
+    rng = np.random.default_rng(seed)
+    # Depth-limited and fully grown trees, with and without bootstrapping, two and many classes
+    configurations = [
+        dict(n_estimators=10, max_depth=4, n_classes=2),
+        dict(n_estimators=25, max_depth=None, n_classes=29),
+        dict(n_estimators=7, max_depth=None, n_classes=5, bootstrap=False),
+    ]
+    for configuration in configurations:
+        n_classes = configuration.pop('n_classes')
+        features = rng.random((600, 20), dtype=np.float32)
+        labels = (features[:, :3].sum(axis=1) * n_classes / 3).astype(int) % n_classes
+        model = RandomForestClassifier(random_state=seed, **configuration).fit(features, labels)
+        forest = CompiledForest(model)
+
+        # Unseen rows, training rows, and rows with one value on a split threshold as seen in
+        # float32 (and its float32 neighbours), where rounding the float64 thresholds matters
+        tree = model.estimators_[0].tree_
+        splits = np.flatnonzero(tree.children_left != -1)
+        probes = rng.random((3 * len(splits), 20), dtype=np.float32)
+        for i, node in enumerate(splits):
+            value = np.float32(tree.threshold[node])
+            for j, probe in enumerate((np.nextafter(value, np.float32(-1)), value, np.nextafter(value, np.float32(2)))):
+                probes[3 * i + j, tree.feature[node]] = probe
+        frames = np.concatenate([rng.random((300, 20), dtype=np.float32), features[:100], probes])
+        assert np.array_equal(forest.predict_proba(frames), model.predict_proba(frames)), configuration
+        for row in frames[:20]:
+            single = row[np.newaxis, :]
+            assert np.array_equal(forest.predict_proba(single), model.predict_proba(single)), configuration
+        empty = forest.predict_proba(np.empty((0, 20), dtype=np.float32))
+        assert empty.shape == (0, model.n_classes_), empty.shape
+        print(f"{forest.n_trees} trees, {forest.n_nodes} nodes, {forest.n_classes} classes: identical to sklearn")
+
+
+def measure(predict_proba, features: np.ndarray, latency_frames: int, batch_size: int) -> dict:
+    # Per-frame latency: one row per call
+    timings = []
+    for row in features[:latency_frames]:
+        start = time.perf_counter()
+        predict_proba(row[np.newaxis, :])
+        timings.append((time.perf_counter() - start) * 1e6)
+
+    # Throughput: full batches, repeated for at least half a second
+    batch = np.resize(features, (batch_size, features.shape[1]))
+    predict_proba(batch)
+    frames, start = 0, time.perf_counter()
+    while time.perf_counter() - start < 0.5:
+        predict_proba(batch)
+        frames += batch_size
+
+    return {
+        'p50_us': float(np.percentile(timings, 50)),
+        'p95_us': float(np.percentile(timings, 95)),
+        'throughput': frames / (time.perf_counter() - start),
+    }
+
+
+def write_report(path: str, csv_path: str, rows: int, batch_size: int, forest: CompiledForest, mismatches: int,
+                 results: dict):
+    lines = [
+        "# Compiled random forest benchmark",
+        "",
+        f"Frames: `{csv_path}` ({rows} frames). Forest: {forest.n_trees} trees, {forest.n_nodes} nodes, "
+        f"max depth {forest.max_depth}. Latency: one frame per call; throughput: batches of {batch_size} frames.",
+        "",
+        f"Parity with sklearn: {rows - mismatches}/{rows} frames with identical probabilities.",
+        "",
+        "| Implementation | p50 latency (us) | p95 latency (us) | Throughput (frames/s) |",
+        "|---|---|---|---|",
+    ]
+    for name, r in results.items():
+        lines.append(f"| {name} | {r['p50_us']:.1f} | {r['p95_us']:.1f} | {r['throughput']:.0f} |")
+    report = "\n".join(lines) + "\n"
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(report)
+    print(report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', help='Landmark CSV used for the parity check and timings')
+    parser.add_argument('--self-check', action='store_true',
+                        help='Only check parity with sklearn on synthetic data (no model files needed)')
+    parser.add_argument('--scaler', default=os.getenv("SCALER_MODEL_PATH", "./models_store/scaler.pkl"))
+    parser.add_argument('--pca', default=os.getenv("PCA_MODEL_PATH", "./models_store/pca.pkl"))
+    parser.add_argument('--model', default=os.getenv("HAND_SIGN_MODEL_PATH", "./models_store/rf_model_pca.pkl"))
+    parser.add_argument('--report', default='./forest_report.md')
+    parser.add_argument('--latency-frames', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+    if args.self_check:
+        self_check()
+        return
+    if not args.csv:
+        parser.error("--csv is required unless --self-check is given")
+
+    (weight, bias), model = load_pipeline(args.scaler, args.pca, args.model)
+    data = pd.read_csv(args.csv)
+    raw = data[FEATURE_COLUMNS].to_numpy(dtype=np.float32)
+    raw = raw[~np.isnan(raw).any(axis=1)]
+    features = raw @ weight + bias
+    print(f"Loaded {len(features)} frames from {args.csv}")
+
+    forest = CompiledForest(model)
+    mismatches = check_parity(model, forest, features)
+    if mismatches:
+        raise SystemExit(f"Compiled forest disagrees with sklearn on {mismatches} of {len(features)} frames.")
+
+    results = {
+        'sklearn': measure(model.predict_proba, features, args.latency_frames, args.batch_size),
+        'compiled': measure(forest.predict_proba, features, args.latency_frames, args.batch_size),
+    }
+    write_report(args.report, args.csv, len(features), args.batch_size, forest, mismatches, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Compile the autocomplete corpus into a completion index file.
+
+The corpus is read, lower-cased and split into words exactly as model_autocomplete.py
+does at runtime, then every word and its count is written to a binary index
+(completion_index.py) together with its lookup tables, and the most frequent next words
+after every one- and two-word context (ngram_table.py). The service memory-maps this
+file at startup instead of reading and counting the corpus; rebuild it whenever the
+corpus changes. The corpus hash and build settings are recorded in the file header.
+
+Usage:
+    python build_vocabulary.py
+    python build_vocabulary.py --corpus big.txt --output models_store/vocabulary.idx --vocabulary-size 20000
+    python build_vocabulary.py --ngram-top-k 0   # Without the n-gram table
+"""
+import argparse
+import datetime
+import hashlib
+import os
+import time
+
+from dotenv import load_dotenv
+
+from completion_index import FORMAT_VERSION
+from model_autocomplete import load_vocabulary
+from ngram_table import NgramTable
+
+load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=os.getenv("AUTOCOMPLETE_CORPUS_PATH", "big.txt"))
+    parser.add_argument('--output', default=os.getenv("AUTOCOMPLETE_INDEX_PATH", "./models_store/vocabulary.idx"))
+    parser.add_argument('--vocabulary-size', type=int, default=int(os.getenv("AUTOCOMPLETE_VOCABULARY_SIZE", "0")),
+                        help='Keep only the most frequent words (0 = all of them)')
+    parser.add_argument('--ngram-top-k', type=int, default=7,
+                        help='Next words kept per context in the n-gram table (0 = no n-gram table)')
+    parser.add_argument('--ngram-min-count', type=int, default=2,
+                        help='Leave out contexts seen fewer times than this')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with open(args.corpus, 'rb') as f:
+        corpus_sha256 = hashlib.sha256(f.read()).hexdigest()
+    index = load_vocabulary(args.corpus, args.vocabulary_size or None, ngram_top_k=args.ngram_top_k,
+                            ngram_min_count=args.ngram_min_count)
+    index.metadata = {
+        'corpus': os.path.basename(args.corpus),
+        'corpus_sha256': corpus_sha256,
+        'vocabulary_size': args.vocabulary_size,
+        'ngram_top_k': args.ngram_top_k,
+        'ngram_min_count': args.ngram_min_count,
+        'built_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+    }
+    index.save(args.output)
+    ngrams = NgramTable.from_index(index)
+    contexts = (f", n-gram contexts: {len(ngrams.arrays['ngram1.keys'])} one-word, "
+                f"{len(ngrams.arrays['ngram2.keys'])} two-word ({ngrams.nbytes / 2**20:.2f} MiB)" if ngrams else "")
+    print(f"Wrote {args.output}: {len(index)} words{contexts}, {os.path.getsize(args.output) / 2**20:.2f} MiB, "
+          f"format version {FORMAT_VERSION} ({time.perf_counter() - start:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
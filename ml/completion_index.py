@@ -0,0 +1,318 @@
+import heapq
+import json
+import mmap
+import time
+from collections import Counter
+
+import numpy as np
+
+# Index file layout: MAGIC, header length (uint32, little-endian), JSON header, then every
+# array section at an 8-byte aligned position recorded in the header. Offsets in the file
+# point into the file itself, so the memory map serves directly as the word blob.
+MAGIC = b'ISLEVOCB'
+FORMAT_VERSION = 1
+
+
+class CompletionIndex:
+    """
+    Word completion over a whole corpus vocabulary, stored in a handful of flat arrays
+    instead of one object per trie node.
+
+    Words are sorted by their UTF-8 bytes and concatenated into one blob (`offsets[i]`
+    to `offsets[i + 1]` is word i), so all words sharing a prefix form one contiguous
+    range found by binary search. A sparse table of range-maximum positions over the
+    word counts gives the most frequent word of any range in constant time; the k most
+    frequent are found by repeatedly splitting the range around the best word.
+    A lookup costs O(len(prefix) * log(n) + k * log(k)), whatever the prefix.
+
+    An index can be saved to a versioned binary file and opened again with open(),
+    which memory-maps it: nothing is parsed or copied, and processes opening the
+    same file share its pages. Tables built on top of the index (see ngram_table.py)
+    travel in the same file as named extra arrays.
+    """
+
+    def __init__(self, blob: bytes | mmap.mmap, offsets: np.ndarray, counts: np.ndarray, top_k: int = 3,
+                 keys: np.ndarray | None = None, range_max: list[np.ndarray] | None = None,
+                 metadata: dict | None = None, extras: dict[str, np.ndarray] | None = None):
+        self.blob = blob
+        self.offsets = offsets
+        self.counts = counts
+        self.top_k = top_k
+        self.metadata = metadata or {}
+        # Named arrays saved and memory-mapped along with the index, e.g. word ids of other tables
+        self.extras = extras or {}
+        self._range_max = range_max if range_max is not None else self._build_range_max(counts)
+        # Lookups read single elements; memoryviews over the same buffers return plain ints
+        # several times faster than indexing NumPy arrays
+        self._offsets = memoryview(offsets)
+        self._counts = memoryview(counts)
+        self._range_max_views = [memoryview(level) for level in self._range_max]
+        # The blob as bytes for vectorized reads (see fuzzy_search)
+        self._blob_bytes = np.frombuffer(blob, dtype=np.uint8)
+        # First 8 bytes of every word as a big-endian integer, zero-padded: sorted like the words
+        # themselves, so np.searchsorted does most of every binary search
+        if keys is None:
+            keys = np.array([self._key(self._word_bytes(i)) for i in range(len(counts))], dtype=np.uint64)
+        self._keys = keys
+
+    @classmethod
+    def from_counts(cls, counts: Counter, top_k: int = 3, vocabulary_size: int | None = None,
+                    metadata: dict | None = None):
+        """Index the vocabulary_size most frequent words of a word counter (all of them by default)."""
+        encoded = sorted((word.encode('utf-8'), count) for word, count in counts.most_common(vocabulary_size))
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(word) for word, _ in encoded])
+        return cls(b''.join(word for word, _ in encoded), offsets,
+                   np.array([count for _, count in encoded], dtype=np.int64), top_k, metadata=metadata)
+
+    def save(self, path: str):
+        """Write the index, including its lookup tables, to a file that open() can memory-map."""
+        arrays = {'offsets': self.offsets - self.offsets[0], 'counts': self.counts, 'keys': self._keys}
+        arrays.update((f'range_max_{level}', table) for level, table in enumerate(self._range_max))
+        arrays.update((f'extra.{name}', array) for name, array in self.extras.items())
+        blob = self.blob[self.offsets[0]:self.offsets[-1]]
+
+        # Section positions depend on the header length and vice versa; grow the header until they agree
+        header_length = 0
+        while True:
+            position = _align(len(MAGIC) + 4 + header_length)
+            sections = {}
+            for name, array in arrays.items():
+                sections[name] = [position, array.dtype.str, len(array)]
+                position = _align(position + array.nbytes)
+            header = json.dumps({
+                'format_version': FORMAT_VERSION, 'words': len(self), 'levels': len(self._range_max),
+                'blob': [position, len(blob)], 'sections': sections, 'extras': list(self.extras),
+                'metadata': self.metadata,
+            }).encode('utf-8')
+            if len(header) <= header_length:
+                break
+            header_length = len(header)
+
+        with open(path, 'wb') as f:
+            f.write(MAGIC + header_length.to_bytes(4, 'little') + header.ljust(header_length))
+            for name, array in arrays.items():
+                if name == 'offsets':
+                    array = array + position  # Point straight into the file's blob section
+                f.seek(sections[name][0])
+                f.write(np.ascontiguousarray(array).tobytes())
+            f.seek(position)
+            f.write(blob)
+
+    @classmethod
+    def open(cls, path: str, top_k: int = 3):
+        """Memory-map an index file written by save(). Raises ValueError for other files or format versions."""
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a completion index file")
+        header_length = int.from_bytes(mapped[len(MAGIC):len(MAGIC) + 4], 'little')
+        header = json.loads(mapped[len(MAGIC) + 4:len(MAGIC) + 4 + header_length])
+        if header['format_version'] != FORMAT_VERSION:
+            raise ValueError(f"{path} has index format version {header['format_version']}, "
+                             f"expected {FORMAT_VERSION}; rebuild it with build_vocabulary.py")
+
+        def section(name: str) -> np.ndarray:
+            start, dtype, length = header['sections'][name]
+            return np.frombuffer(mapped, dtype=dtype, count=length, offset=start)
+
+        range_max = [section(f'range_max_{level}') for level in range(header['levels'])]
+        extras = {name: section(f'extra.{name}') for name in header.get('extras', [])}
+        return cls(mapped, section('offsets'), section('counts'), top_k, keys=section('keys'), range_max=range_max,
+                   metadata=header['metadata'], extras=extras)
+
+    @staticmethod
+    def _build_range_max(counts: np.ndarray) -> list[np.ndarray]:
+        # Level j holds, for every i, the position of the largest count in [i, i + 2**j);
+        # ties go to the lower position, i.e. the alphabetically first word
+        levels = [np.arange(len(counts), dtype=np.int32)]
+        width = 1
+        while 2 * width <= len(counts):
+            previous = levels[-1]
+            left, right = previous[:-width], previous[width:]
+            levels.append(np.where(counts[right] > counts[left], right, left).astype(np.int32))
+            width *= 2
+        return levels
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def word(self, i: int) -> str:
+        return self._word_bytes(i).decode('utf-8')
+
+    def _word_bytes(self, i: int) -> bytes:
+        return self.blob[self._offsets[i]:self._offsets[i + 1]]
+
+    @staticmethod
+    def _key(word: bytes) -> int:
+        return int.from_bytes(word[:8].ljust(8, b'\0'), 'big')
+
+    def _position(self, word: bytes) -> int:
+        """Position of the first word >= word in byte order."""
+        key = np.uint64(self._key(word))
+        low = int(self._keys.searchsorted(key, 'left'))
+        if len(word) <= 8:
+            # Words never contain NUL bytes, so a shorter word's padded key ties only with itself
+            return low
+        # Longer words: finish among the words sharing the first 8 bytes
+        high = int(self._keys.searchsorted(key, 'right'))
+        blob, offsets = self.blob, self._offsets
+        while low < high:
+            middle = (low + high) // 2
+            if blob[offsets[middle]:offsets[middle + 1]] < word:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def prefix_range(self, prefix: str) -> tuple[int, int]:
+        """Positions [start, end) of the words starting with prefix."""
+        encoded = prefix.encode('utf-8')
+        if not encoded:
+            return 0, len(self)
+        # 0xff never occurs in UTF-8, so it sorts after every continuation of the prefix
+        upper = encoded + b'\xff'
+        if len(upper) <= 8:
+            # Both bounds from the keys alone, in a single call
+            bounds = np.array([self._key(encoded), self._key(upper)], dtype=np.uint64)
+            start, end = self._keys.searchsorted(bounds).tolist()
+            return start, end
+        return self._position(encoded), self._position(upper)
+
+    def fuzzy_search(self, prefix: str, max_edits: int = 1, limit: int | None = None,
+                     budget_ms: float | None = None) -> list[tuple[str, int]]:
+        """
+        Words starting with something within max_edits edits (insertions, deletions,
+        substitutions) of prefix, as (word, edits), fewest edits first and then most frequent.
+        At most limit words (top_k by default).
+
+        The sorted words are walked as an implicit trie: a node is a range of words sharing a
+        prefix, and its children are the runs of equal bytes at the next position. Each node
+        extends the edit distance table of its parent by one row, and a branch is abandoned once
+        every entry exceeds max_edits. With budget_ms, the walk stops after that long and ranks
+        what it has found so far.
+        """
+        target = prefix.encode('utf-8')
+        limit = limit or self.top_k
+        deadline = time.perf_counter() + budget_ms / 1000 if budget_ms else None
+        # (edits, start, end): every word in [start, end) is within edits of prefix
+        matches = []
+        # Entries above max_edits only matter as "too many", so they are capped at max_edits + 1
+        cap = max_edits + 1
+        root = [min(j, cap) for j in range(len(target) + 1)]
+        if root[-1] <= max_edits:
+            matches.append((root[-1], 0, len(self)))
+        stack = [(0, 0, len(self), root)]
+        while stack:
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            depth, start, end, row = stack.pop()
+            if start < end and self._offsets[start + 1] - self._offsets[start] == depth:
+                start += 1  # The node's own word sorts first and has no children
+            if start == end:
+                continue
+            # Children are the runs of equal bytes at this depth, all found in one pass
+            letters = self._blob_bytes[self.offsets[start:end] + depth]
+            firsts = np.flatnonzero(np.concatenate(([True], letters[1:] != letters[:-1])))
+            starts = (firsts + start).tolist()
+            for byte, child_start, child_end in zip(letters[firsts].tolist(), starts, starts[1:] + [end]):
+                # Only entries within max_edits of the diagonal can be at most max_edits
+                child_row = [cap] * len(row)
+                closest = child_row[0] = min(depth + 1, cap)
+                for j in range(max(1, depth + 1 - max_edits), min(len(target), depth + 1 + max_edits) + 1):
+                    edits = min(row[j] + 1, child_row[j - 1] + 1, row[j - 1] + (target[j - 1] != byte))
+                    child_row[j] = edits
+                    if edits < closest:
+                        closest = edits
+                if closest <= max_edits:
+                    if child_row[-1] <= max_edits:
+                        matches.append((child_row[-1], child_start, child_end))
+                    # Distances never drop below the row minimum further down, so only descend if that is lower
+                    if closest < child_row[-1]:
+                        stack.append((depth + 1, child_start, child_end, child_row))
+        return self._rank_matches(matches, limit)
+
+    def _rank_matches(self, matches: list[tuple[int, int, int]], limit: int) -> list[tuple[str, int]]:
+        """The limit most frequent words of the matched ranges, fewest edits first."""
+        results = []
+        taken = set()
+        for edits in sorted({edits for edits, _, _ in matches}):
+            # Ranges are nested or disjoint; keep the outermost ones
+            ranges, covered = [], -1
+            for _, start, end in sorted((m for m in matches if m[0] == edits), key=lambda m: (m[1], -m[2])):
+                if end > covered:
+                    ranges.append((start, end))
+                    covered = end
+            candidates = []
+            for start, end in ranges:
+                best = self._best(start, end)
+                candidates.append((-self._counts[best], best, start, end))
+            heapq.heapify(candidates)
+            while candidates and len(results) < limit:
+                _, best, start, end = heapq.heappop(candidates)
+                if best not in taken:  # Already found with fewer edits
+                    taken.add(best)
+                    results.append((self.word(best), edits))
+                for low, high in ((start, best), (best + 1, end)):
+                    if low < high:
+                        position = self._best(low, high)
+                        heapq.heappush(candidates, (-self._counts[position], position, low, high))
+            if len(results) >= limit:
+                break
+        return results
+
+    def _best(self, start: int, end: int) -> int:
+        level = (end - start).bit_length() - 1
+        table = self._range_max_views[level]
+        left, right = table[start], table[end - (1 << level)]
+        return right if self._counts[right] > self._counts[left] else left
+
+    def search(self, prefix: str) -> list[str]:
+        """The top_k most frequent words starting with prefix, most frequent first."""
+        start, end = self.prefix_range(prefix)
+        results = []
+        candidates = []
+        if start < end:
+            best = self._best(start, end)
+            candidates.append((-self._counts[best], best, start, end))
+        while candidates and len(results) < self.top_k:
+            _, best, start, end = heapq.heappop(candidates)
+            results.append(self.word(best))
+            for low, high in ((start, best), (best + 1, end)):
+                if low < high:
+                    position = self._best(low, high)
+                    heapq.heappush(candidates, (-self._counts[position], position, low, high))
+        return results
+
+    def find(self, word: str) -> int:
+        """Position (word id) of word, -1 if it is not in the vocabulary."""
+        encoded = word.encode('utf-8')
+        i = self._position(encoded)
+        return i if i < len(self) and self._word_bytes(i) == encoded else -1
+
+    def count(self, word: str) -> int:
+        """Corpus count of word, 0 if it is not in the vocabulary."""
+        i = self.find(word)
+        return self._counts[i] if i >= 0 else 0
+
+    def is_word_complete(self, word: str, min_count: int = 1) -> bool:
+        """Whether word is in the vocabulary with a corpus count of at least min_count."""
+        return self.count(word) >= max(1, min_count)
+
+    def min_count_of_top(self, n: int) -> int:
+        """Corpus count of the n-th most frequent word: the words at least that frequent are the top n, plus ties."""
+        if n <= 0 or n >= len(self):
+            return 1
+        return int(np.partition(self.counts, len(self) - n)[len(self) - n])
+
+    def __contains__(self, word: str) -> bool:
+        return self.is_word_complete(word)
+
+    @property
+    def nbytes(self) -> int:
+        return (int(self.offsets[-1] - self.offsets[0]) + self.offsets.nbytes + self.counts.nbytes + self._keys.nbytes
+                + sum(level.nbytes for level in self._range_max) + sum(array.nbytes for array in self.extras.values()))
+
+
+def _align(position: int) -> int:
+    return (position + 7) // 8 * 8
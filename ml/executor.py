@@ -0,0 +1,57 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from utils import log_info
+
+
+class ModelExecutor:
+    """
+    Bounded worker pool for one model type, so inference never runs on the event loop.
+    Threads are used because TFLite invoke() and torch release the GIL while computing;
+    per-thread model state (e.g. TFLite interpreters) is kept by the models themselves.
+    Callers bound the work they hand it (see BatchScheduler, which never runs more
+    batches than there are workers and limits how many items wait for one).
+    """
+
+    def __init__(self, name: str, max_workers: int = 1, verbose: bool = True):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{name}-worker")
+        log_info(f"Executor '{name}' ready ({self.max_workers} workers)", verbose)
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """Run fn(*args) on a worker thread and await its result."""
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    def run_on_each_worker(self, fn: Callable[..., Any], *args, then: Callable[[], Any] | None = None) -> list:
+        """
+        Run fn(*args) once on every worker thread, for per-thread state such as TFLite
+        interpreters, and return the results. Blocks, so call it from a background thread.
+        Each call waits until every worker has picked one up (so no worker runs two) and
+        until all have finished; then(), if given, runs at that point, before any worker
+        takes other work. If a call raises, the workers are released without then() and
+        the error is raised here.
+        """
+        started = threading.Barrier(self.max_workers)
+        finished = threading.Barrier(self.max_workers, action=then)
+
+        def call():
+            started.wait()
+            try:
+                result = fn(*args)
+            except BaseException:
+                finished.abort()
+                raise
+            finished.wait()
+            return result
+
+        futures = [self._pool.submit(call) for _ in range(self.max_workers)]
+        errors = [future.exception() for future in futures]
+        # Report the call that failed rather than the workers it released
+        error = next((e for e in errors if e is not None and not isinstance(e, threading.BrokenBarrierError)),
+                     next((e for e in errors if e is not None), None))
+        if error is not None:
+            raise error
+        return [future.result() for future in futures]
@@ -0,0 +1,95 @@
+import numpy as np
+
+
+class CompiledForest:
+    """
+    A fitted sklearn random forest classifier flattened into NumPy node arrays.
+
+    Every tree's nodes are concatenated into one set of arrays (split feature,
+    threshold, left/right child), with leaves pointing to themselves. A batch is
+    evaluated for all trees at once: each step moves every (frame, tree) cursor
+    one level down, for as many steps as the deepest tree. Class probabilities
+    are averaged per tree in the same order and precision as sklearn, so
+    predict_proba matches RandomForestClassifier.predict_proba exactly.
+    """
+
+    def __init__(self, forest):
+        estimators = getattr(forest, 'estimators_', None)
+        if not estimators or not hasattr(estimators[0], 'tree_'):
+            raise ValueError(f"Cannot compile {type(forest).__name__}: expected a fitted forest of decision trees")
+        if getattr(forest, 'n_outputs_', 1) != 1:
+            raise ValueError("Cannot compile multi-output forests")
+
+        self.n_classes = int(forest.n_classes_)
+        self.n_features = int(forest.n_features_in_)
+        self.n_trees = len(estimators)
+
+        features, thresholds, lefts, rights, leaf_slots, leaf_values, roots = [], [], [], [], [], [], []
+        offset, n_leaves, depth = 0, 0, 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count)
+            is_leaf = tree.children_left == -1
+
+            # sklearn compares float32 inputs against float64 thresholds; round each threshold
+            # down to the nearest float32 so x <= threshold gives the same answer in float32
+            threshold = tree.threshold.astype(np.float32)
+            rounded_up = threshold.astype(np.float64) > tree.threshold
+            threshold[rounded_up] = np.nextafter(threshold[rounded_up], np.float32(-np.inf))
+
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.intp))
+            thresholds.append(threshold)
+            lefts.append(np.where(is_leaf, node_ids, tree.children_left) + offset)
+            rights.append(np.where(is_leaf, node_ids, tree.children_right) + offset)
+
+            # Leaf class distributions. sklearn >= 1.4 stores them as fractions already; older
+            # versions store weighted counts and normalize in DecisionTreeClassifier.predict_proba
+            values = tree.value[is_leaf, 0, :]
+            totals = values.sum(axis=1, keepdims=True)
+            if not np.allclose(totals, 1.0):
+                values = values / totals
+            leaf_values.append(values)
+            slots = np.zeros(tree.node_count, dtype=np.intp)
+            slots[is_leaf] = np.arange(n_leaves, n_leaves + is_leaf.sum())
+            leaf_slots.append(slots)
+
+            roots.append(offset)
+            offset += tree.node_count
+            n_leaves += int(is_leaf.sum())
+            depth = max(depth, int(tree.max_depth))
+
+        self.feature = np.concatenate(features)
+        self.threshold = np.concatenate(thresholds)
+        # Children interleaved per node: [2 * node] is the left child, [2 * node + 1] the right child
+        self.children = np.stack([np.concatenate(lefts), np.concatenate(rights)], axis=1).ravel().astype(np.intp)
+        self.leaf_slot = np.concatenate(leaf_slots)
+        self.leaf_values = np.concatenate(leaf_values)
+        self.roots = np.array(roots, dtype=np.intp)
+        self.max_depth = depth
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """Return the global leaf node reached by every frame in every tree, shape (n_frames, n_trees)."""
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected input of shape (n, {self.n_features}), got {X.shape}")
+        flat = X.ravel()
+        row_offsets = (np.arange(len(X)) * self.n_features)[:, np.newaxis]
+        nodes = np.repeat(self.roots[np.newaxis, :], len(X), axis=0)
+        for _ in range(self.max_depth):
+            goes_right = flat[row_offsets + self.feature[nodes]] > self.threshold[nodes]
+            nodes = self.children[2 * nodes + goes_right]
+        return nodes
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Average of the per-tree class distributions, shape (n_frames, n_classes)."""
+        leaves = self.leaf_slot[self.apply(X)]
+        # Summing over the tree axis adds tree by tree, in order, as sklearn does,
+        # so ties between classes resolve identically
+        proba = self.leaf_values[leaves].sum(axis=1)
+        proba /= self.n_trees
+        return proba
+
@@ -0,0 +1,51 @@
+import numpy as np
+
+from metrics import Counter, Gauge
+
+cache_hits_total = Counter('handsign_cache_hits_total', 'Frames answered from the per-session prediction cache')
+cache_misses_total = Counter('handsign_cache_misses_total', 'Frames that needed a fresh hand sign inference')
+cache_hit_ratio = Gauge(
+    'handsign_cache_hit_ratio', 'Share of hand sign frames answered from the per-session prediction cache',
+    fn=lambda: cache_hits_total.value / max(1, cache_hits_total.value + cache_misses_total.value),
+)
+
+
+class PredictionCache:
+    """
+    Per-session cache of the last feature row sent to the model and its prediction.
+    A new frame whose landmarks all lie within max_distance of the cached row
+    (largest absolute coordinate difference) reuses the cached prediction.
+    A max_distance of 0 disables the cache.
+    """
+
+    def __init__(self, max_distance: float = 0.005):
+        self.max_distance = max(0.0, max_distance)
+        self._entries: dict[str, tuple[np.ndarray, object]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_distance > 0
+
+    def lookup(self, sid: str, features: np.ndarray):
+        """Return the cached prediction if features is a near-duplicate of the session's last frame, else None."""
+        if not self.enabled:
+            return None
+        entry = self._entries.get(sid)
+        if entry is not None and np.max(np.abs(features - entry[0])) <= self.max_distance:
+            cache_hits_total.inc()
+            return entry[1]
+        cache_misses_total.inc()
+        return None
+
+    def store(self, sid: str, features: np.ndarray, prediction):
+        if self.enabled and prediction is not None:
+            self._entries[sid] = (features, prediction)
+
+    def forget(self, sid: str):
+        self._entries.pop(sid, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,203 @@
+import hashlib
+from abc import ABC, abstractmethod
+import threading
+import time
+from typing import Callable, NamedTuple
+
+import numpy as np
+
+from metrics import Histogram
+from landmarks import NUM_FEATURES
+from utils import log_error, log_info
+
+STAGE_BUCKETS_US = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 100000]
+# Server-side stages, measured per frame
+SERVER_STAGES = ('decode', 'queue', 'emit')
+# Model stages, measured per batch call and recorded per backend (a shadow backend gets its own series)
+MODEL_STAGES = ('preprocess', 'scale', 'invoke', 'postprocess')
+
+stage_latency = {
+    stage: Histogram('handsign_stage_latency_us', 'Per-frame latency of each server-side hand sign stage (microseconds)',
+                     STAGE_BUCKETS_US, labels={'stage': stage})
+    for stage in SERVER_STAGES
+}
+_model_stage_latency: dict[str, dict[str, Histogram]] = {}
+_model_stage_lock = threading.Lock()
+
+
+def model_stage_latency(backend: str) -> dict[str, Histogram]:
+    """Per-stage latency histograms of one backend's batch calls, created on first use."""
+    with _model_stage_lock:
+        histograms = _model_stage_latency.get(backend)
+        if histograms is None:
+            histograms = _model_stage_latency[backend] = {
+                stage: Histogram('handsign_model_stage_latency_us',
+                                 'Latency of each stage of a hand sign backend batch call (microseconds)',
+                                 STAGE_BUCKETS_US, labels={'backend': backend, 'stage': stage})
+                for stage in MODEL_STAGES
+            }
+    return histograms
+
+
+class StageTimer:
+    """Records the time elapsed since the previous mark (or creation) under one of a backend's model stages."""
+    __slots__ = ('_histograms', '_last')
+
+    def __init__(self, backend: str):
+        self._histograms = model_stage_latency(backend)
+        self._last = time.perf_counter()
+
+    def mark(self, stage: str):
+        now = time.perf_counter()
+        self._histograms[stage].observe((now - self._last) * 1e6)
+        self._last = now
+
+
+class HandSignPrediction(NamedTuple):
+    label: str          # Predicted character, or "delete" / "space" / "autocmp"
+    prob: float         # Probability of the predicted class
+    probs: np.ndarray   # Probability of every class, indexed like the backend's labels
+    version: str | None = None  # Version of the model that produced the prediction
+
+
+def model_version(*contents: bytes) -> str:
+    """Short content hash identifying one set of model files."""
+    digest = hashlib.sha256()
+    for content in contents:
+        digest.update(content)
+    return digest.hexdigest()[:12]
+
+
+def _sanity_frames(rows: int = 8) -> np.ndarray:
+    # Fixed pseudo-random landmark rows in the camera's [0, 1) range
+    return np.random.default_rng(0).random((rows, NUM_FEATURES), dtype=np.float32)
+
+
+class HandSignBackend(ABC):
+    """
+    Interface shared by every hand sign model. A backend takes a batch of frames
+    (landmark dict lists, packed binary frames or decoded feature rows) and returns
+    one HandSignPrediction, or None, per frame. predict_batch may be called from
+    several worker threads at once.
+
+    Everything a prediction needs from the model files is bundled in one loaded
+    model object (with a `version` attribute) held in `_active`. predict_batch reads
+    it once per call, so reload() can swap in a new version at any time while
+    batches already running finish on the old one.
+
+    Subclasses must implement labels, model_files, _load_model and _predict_with;
+    a backend missing any of them cannot be instantiated.
+    """
+    name = "base"
+    _active = None
+
+    @property
+    @abstractmethod
+    def labels(self) -> list[str]:
+        # Label of every output class, in model output order
+        ...
+
+    @property
+    @abstractmethod
+    def model_files(self) -> list[str]:
+        # Files the loaded model is built from; a change to any of them calls for a reload
+        ...
+
+    @property
+    def is_ready(self) -> bool:
+        return self._active is not None
+
+    @property
+    def version(self) -> str | None:
+        active = self._active
+        return None if active is None else active.version
+
+    @abstractmethod
+    def _load_model(self):
+        """Read the model files and return a new loaded model object. Raises on failure."""
+
+    @abstractmethod
+    def _predict_with(self, model, frames: list) -> list[HandSignPrediction | None]:
+        """Predict every frame with the given loaded model."""
+
+    def predict_batch(self, frames: list) -> list[HandSignPrediction | None]:
+        model = self._active
+        if model is None:
+            log_error(f"Hand sign backend '{self.name}' has no model loaded. Cannot predict.")
+            return [None] * len(frames)
+        if not frames:
+            return []
+        return self._predict_with(model, frames)
+
+    def predict(self, landmarks_data: list[dict]) -> tuple[str, float] | None:
+        prediction = self.predict_batch([landmarks_data])[0]
+        return None if prediction is None else (prediction.label, prediction.prob)
+
+    def reload(self, run_on_workers: Callable | None = None) -> str:
+        """
+        Load the model files again, warm the new model up and check it on a sanity
+        batch, then swap it in. Returns the new version. Raises (keeping the current
+        model) if loading or any check fails.
+
+        Per-thread model state (e.g. TFLite interpreters) is built by the thread that
+        predicts. With run_on_workers (ModelExecutor.run_on_each_worker), the warmup and
+        checks run on every serving worker, and the new model is swapped in while they
+        are all still held, so no worker meets it cold.
+        """
+        candidate = self._load_model()
+        if run_on_workers is None:
+            self._verify(candidate)
+            self._active = candidate
+        else:
+            run_on_workers(self._verify, candidate, then=lambda: setattr(self, '_active', candidate))
+        return candidate.version
+
+    def _verify(self, candidate):
+        frames = _sanity_frames()
+        self._predict_with(candidate, list(frames[:1]))  # Warmup: first-call allocations
+        results = self._predict_with(candidate, list(frames))
+        if any(result is None for result in results):
+            raise ValueError(f"Model {candidate.version} returned no prediction for a sanity frame")
+        probs = np.stack([result.probs for result in results])
+        if not np.isfinite(probs).all() or probs.min() < 0 or probs.max() > 1 + 1e-6:
+            raise ValueError(f"Model {candidate.version} returned probabilities outside [0, 1]")
+        if self._active is not None and probs.shape[1] != len(self.labels):
+            raise ValueError(f"Model {candidate.version} has {probs.shape[1]} classes, "
+                             f"the active model has {len(self.labels)}")
+
+
+# Backend name -> factory. Factories import their model lazily, so unused backends cost nothing.
+_BACKENDS: dict[str, Callable[[], HandSignBackend]] = {}
+
+
+def register_backend(name: str):
+    def decorator(factory: Callable[[], HandSignBackend]):
+        _BACKENDS[name] = factory
+        return factory
+    return decorator
+
+
+def available_backends() -> list[str]:
+    return sorted(_BACKENDS)
+
+
+def create_backend(name: str) -> HandSignBackend:
+    """Instantiate (or fetch the singleton of) a registered backend. Raises ValueError for unknown names."""
+    factory = _BACKENDS.get(name)
+    if factory is None:
+        raise ValueError(f"Unknown hand sign backend '{name}', expected one of {available_backends()}")
+    backend = factory()
+    log_info(f"Hand sign backend '{name}' selected ({len(backend.labels)} classes)")
+    return backend
+
+
+@register_backend("tflite")
+def _tflite_backend() -> HandSignBackend:
+    from model_handsign import hand_sign_recognizer
+    return hand_sign_recognizer
+
+
+@register_backend("rf")
+def _random_forest_backend() -> HandSignBackend:
+    from model_handsign_rf import hand_sign_recognizer
+    return hand_sign_recognizer
@@ -0,0 +1,118 @@
+import os
+import signal
+import threading
+from typing import Callable
+
+from handsign_backends import HandSignBackend
+from metrics import Counter, Gauge
+from utils import log_error, log_info
+
+
+class ModelReloader:
+    """
+    Reloads hand sign backends while the service keeps running. Every backend's
+    model files are polled for changes (modification time and size); once a
+    changed set has stayed unchanged for one poll interval, so a copy in progress
+    is not picked up half-written, the backend reloads it. SIGHUP reloads every
+    backend right away (also when the signal arrived before start()). A
+    poll_seconds of 0 disables polling.
+
+    Reloads run on this watcher's own thread: the new version is loaded, warmed up
+    and checked on a sanity batch before it replaces the active one, and a failed
+    reload keeps the current model. A backend watched with run_on_workers is warmed
+    up and checked on those worker threads instead (see HandSignBackend.reload). on_swap(backend), if given, is called after
+    every successful swap.
+    """
+
+    def __init__(self, poll_seconds: float = 2.0, on_swap: Callable[[HandSignBackend], None] | None = None,
+                 verbose: bool = True):
+        self.backends: list[HandSignBackend] = []
+        self.poll_seconds = poll_seconds
+        self.on_swap = on_swap
+        self._verbose = verbose
+        self._requested = threading.Event()
+        self._thread: threading.Thread | None = None
+        # Backend name -> file signature of the loaded model, and of the last poll
+        self._loaded: dict[str, tuple] = {}
+        self._run_on_workers: dict[str, Callable | None] = {}
+        self._seen: dict[str, tuple] = {}
+        self._reloads: dict[str, Counter] = {}
+        self._failures: dict[str, Counter] = {}
+        self._info: dict[str, Gauge] = {}
+
+    def watch(self, backend: HandSignBackend, run_on_workers: Callable | None = None):
+        """Add a loaded backend. Backends must all be added before start()."""
+        labels = {'backend': backend.name}
+        self.backends.append(backend)
+        self._run_on_workers[backend.name] = run_on_workers
+        self._loaded[backend.name] = self._seen[backend.name] = self._signature(backend)
+        self._reloads[backend.name] = Counter(
+            'handsign_model_reloads_total', 'Hand sign models swapped in without a restart', labels=labels)
+        self._failures[backend.name] = Counter(
+            'handsign_model_reload_failures_total', 'Hand sign model reloads rejected by loading or verification',
+            labels=labels)
+        self._info[backend.name] = Gauge(
+            'handsign_model_info', 'Active hand sign model version of each backend (always 1)',
+            labels={**labels, 'version': backend.version or ''})
+        self._info[backend.name].set(1)
+
+    def install_signal_handler(self):
+        """Reload on SIGHUP. Must be called from the main thread; a no-op where SIGHUP does not exist."""
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, lambda signum, frame: self.request_reload())
+
+    def start(self):
+        """Start watching in the background. Calling it again has no effect."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="handsign-reloader", daemon=True)
+            self._thread.start()
+
+    def request_reload(self):
+        """Reload every backend on the watcher thread, whether or not its files changed."""
+        self._requested.set()
+
+    @staticmethod
+    def _signature(backend: HandSignBackend) -> tuple:
+        signature = []
+        for path in backend.model_files:
+            try:
+                stat = os.stat(path)
+                signature.append((path, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append((path, None, None))
+        return tuple(signature)
+
+    def _run(self):
+        while True:
+            # Without a poll interval, only explicit requests trigger a reload
+            forced = self._requested.wait(self.poll_seconds if self.poll_seconds > 0 else None)
+            self._requested.clear()
+            for backend in self.backends:
+                signature = self._signature(backend)
+                settled = signature == self._seen[backend.name]
+                self._seen[backend.name] = signature
+                if forced:
+                    self._reload(backend, signature, "reload requested")
+                elif settled and signature != self._loaded[backend.name]:
+                    self._reload(backend, signature, "model files changed")
+
+    def _reload(self, backend: HandSignBackend, signature: tuple, reason: str):
+        # Remember the attempt even if it fails, so broken files are not retried until they change again
+        self._loaded[backend.name] = signature
+        previous = backend.version
+        log_info(f"Reloading hand sign backend '{backend.name}' ({reason}), current version {previous}", self._verbose)
+        try:
+            version = backend.reload(self._run_on_workers[backend.name])
+        except Exception as e:
+            self._failures[backend.name].inc()
+            log_error(f"Hand sign backend '{backend.name}' reload failed, keeping version {previous}: {e}")
+            return
+
+        self._reloads[backend.name].inc()
+        self._info[backend.name].labels = {'backend': backend.name, 'version': version}
+        if version == previous:
+            log_info(f"Hand sign backend '{backend.name}' reloaded, version {version} unchanged", self._verbose)
+        else:
+            log_info(f"Hand sign backend '{backend.name}' swapped from version {previous} to {version}", self._verbose)
+        if self.on_swap is not None:
+            self.on_swap(backend)
@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+from typing import Any, NamedTuple
+
+from metrics import Counter, Gauge
+
+kv_cache_reused_tokens_total = Counter(
+    'autocomplete_kv_cache_reused_tokens_total', 'Prompt tokens served from a session\'s cached language model state')
+kv_cache_computed_tokens_total = Counter(
+    'autocomplete_kv_cache_computed_tokens_total', 'Prompt tokens the language model had to process')
+kv_cache_evictions_total = Counter(
+    'autocomplete_kv_cache_evictions_total', 'Session language model states evicted to stay under the memory cap')
+
+
+class CachedPrefix(NamedTuple):
+    token_ids: list[int]    # Tokens of the session's last prompt
+    past_key_values: Any    # Model cache covering all of token_ids
+    logits: Any             # Next-token logits after the last token
+    nbytes: int
+
+
+class SessionKVCache:
+    """
+    Per-session language model state, so a prompt that grows a letter or a word at a time
+    only runs the model over its new tokens. Entries are evicted least recently used first
+    once their total size exceeds max_bytes; a max_bytes of 0 disables the cache.
+
+    take() removes the session's entry, so a request owns it (and may crop it) until it
+    puts the updated state back. A session forgotten in the meantime (it disconnected while
+    its request ran) is remembered, and its state is not put back.
+    """
+    # Forgotten sessions remembered, most recent last; a request outlives far fewer disconnections
+    max_forgotten = 4096
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max(0, max_bytes)
+        self._entries: OrderedDict[str, CachedPrefix] = OrderedDict()
+        self._bytes = 0
+        self._forgotten: OrderedDict[str, None] = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes_gauge = Gauge('autocomplete_kv_cache_bytes', 'Memory held by cached session language model states',
+                                  fn=lambda: self._bytes)
+        self._entries_gauge = Gauge('autocomplete_kv_cache_sessions', 'Sessions with a cached language model state',
+                                    fn=lambda: len(self._entries))
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def take(self, sid: str) -> CachedPrefix | None:
+        with self._lock:
+            entry = self._entries.pop(sid, None)
+            if entry is not None:
+                self._bytes -= entry.nbytes
+            return entry
+
+    def put(self, sid: str, token_ids: list[int], past_key_values, logits):
+        nbytes = cache_nbytes(past_key_values)
+        if not self.enabled or nbytes > self.max_bytes:
+            return
+        with self._lock:
+            if sid in self._forgotten:
+                return
+            previous = self._entries.pop(sid, None)
+            if previous is not None:
+                self._bytes -= previous.nbytes
+            self._entries[sid] = CachedPrefix(token_ids, past_key_values, logits, nbytes)
+            self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                kv_cache_evictions_total.inc()
+
+    def forget(self, sid: str):
+        with self._lock:
+            self._forgotten[sid] = None
+            if len(self._forgotten) > self.max_forgotten:
+                self._forgotten.popitem(last=False)
+        self.take(sid)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def cache_nbytes(past_key_values) -> int:
+    return sum(layer.keys.nbytes + layer.values.nbytes for layer in past_key_values.layers)
+
+
+def shared_prefix_length(a: list[int], b: list[int]) -> int:
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
@@ -0,0 +1,125 @@
+from typing import NamedTuple
+
+import numpy as np
+
+# MediaPipe hand landmark layout used by every hand sign model
+NUM_LANDMARKS = 21
+LANDMARK_COORDS = ('x', 'y', 'z')
+NUM_FEATURES = NUM_LANDMARKS * len(LANDMARK_COORDS)
+# Training data / scaler column order: all x, then all y, then all z
+FEATURE_COLUMNS = [f'landmark_{i}_{coord}' for coord in LANDMARK_COORDS for i in range(NUM_LANDMARKS)]
+
+# Binary frame formats: 63 little-endian values, landmark by landmark (x0, y0, z0, x1, ...)
+BINARY_FORMATS = {
+    'f32': np.dtype('<f4'),
+    'i16': np.dtype('<i2'),
+}
+# Default dequantization step for int16 frames: covers [-2, 2) at ~6e-5 resolution
+DEFAULT_INT16_SCALE = 1.0 / 16384
+
+
+class PackedLandmarks(NamedTuple):
+    values: np.ndarray  # (21, 3) view over the received bytes, float32 or int16
+    scale: float        # Multiplier applied to the stored values (1.0 for float32)
+
+
+def decode_binary_landmarks(payload: bytes, fmt: str | None = None, scale: float | None = None) -> PackedLandmarks:
+    """
+    Decode a binary landmark frame without copying it.
+    The format is taken from fmt ('f32' or 'i16') or, if omitted, from the payload size.
+    Raises ValueError for unknown formats or payloads of the wrong size.
+    """
+    if fmt is None:
+        fmt = next((name for name, dtype in BINARY_FORMATS.items() if len(payload) == NUM_FEATURES * dtype.itemsize), None)
+        if fmt is None:
+            raise ValueError(f"Binary landmark frame has {len(payload)} bytes, expected "
+                             f"{' or '.join(str(NUM_FEATURES * d.itemsize) for d in BINARY_FORMATS.values())}")
+    dtype = BINARY_FORMATS.get(fmt)
+    if dtype is None:
+        raise ValueError(f"Unknown binary landmark format '{fmt}', expected one of {list(BINARY_FORMATS)}")
+    if len(payload) != NUM_FEATURES * dtype.itemsize:
+        raise ValueError(f"Binary landmark frame has {len(payload)} bytes, expected {NUM_FEATURES * dtype.itemsize} for '{fmt}'")
+
+    values = np.frombuffer(payload, dtype=dtype).reshape(NUM_LANDMARKS, len(LANDMARK_COORDS))
+    if dtype.kind == 'f':
+        return PackedLandmarks(values, 1.0)
+    return PackedLandmarks(values, DEFAULT_INT16_SCALE if scale is None else float(scale))
+
+
+def encode_binary_landmarks(points: np.ndarray, fmt: str = 'f32', scale: float = DEFAULT_INT16_SCALE) -> bytes:
+    """Pack (21, 3) landmark coordinates into a binary frame; the inverse of decode_binary_landmarks."""
+    dtype = BINARY_FORMATS.get(fmt)
+    if dtype is None:
+        raise ValueError(f"Unknown binary landmark format '{fmt}', expected one of {list(BINARY_FORMATS)}")
+    points = np.asarray(points, dtype=np.float32).reshape(NUM_LANDMARKS, len(LANDMARK_COORDS))
+    if dtype.kind == 'i':
+        limits = np.iinfo(dtype)
+        points = np.clip(np.rint(points / scale), limits.min, limits.max)
+    return points.astype(dtype).tobytes()
+
+
+def new_feature_buffer(rows: int = 1) -> np.ndarray:
+    """Allocate a float32 feature buffer with the model's column layout."""
+    return np.empty((rows, NUM_FEATURES), dtype=np.float32)
+
+
+def fill_feature_row(landmarks_data: list[dict] | PackedLandmarks | np.ndarray, out: np.ndarray) -> bool:
+    """
+    Decode a list of landmark dicts, a packed binary frame or a decoded row straight into a feature row.
+    Columns follow the training order: landmark_0_x .. landmark_20_x, then y, then z.
+    Missing coordinates become NaN. Returns False if the row cannot be filled.
+    """
+    if isinstance(landmarks_data, np.ndarray):  # Already a decoded feature row
+        out[:] = landmarks_data
+        return True
+    if isinstance(landmarks_data, PackedLandmarks):
+        columns = out.reshape(len(LANDMARK_COORDS), NUM_LANDMARKS)
+        columns[:] = landmarks_data.values.T
+        if landmarks_data.scale != 1.0:
+            columns *= landmarks_data.scale
+        return True
+    if not landmarks_data or not isinstance(landmarks_data, list) or len(landmarks_data) < NUM_LANDMARKS:
+        return False
+    points = landmarks_data[:NUM_LANDMARKS]
+    try:
+        out[:] = [point.get(coord) for coord in LANDMARK_COORDS for point in points]
+    except (AttributeError, TypeError, ValueError):  # Points that are not dicts, coordinates that are not numbers
+        return False
+    return True
+
+
+def to_feature_row(landmarks_data: list[dict] | PackedLandmarks) -> np.ndarray | None:
+    """Decode one frame into a new float32 feature row, or None if it cannot be decoded."""
+    row = new_feature_buffer()[0]
+    return row if fill_feature_row(landmarks_data, row) else None
+
+
+def _standard_scaler_terms(scaler) -> tuple[np.ndarray, np.ndarray]:
+    mean = scaler.mean_ if scaler.with_mean else np.zeros(scaler.n_features_in_)
+    scale = scaler.scale_ if scaler.with_std else np.ones(scaler.n_features_in_)
+    factor = 1.0 / np.asarray(scale, dtype=np.float64)
+    offset = -np.asarray(mean, dtype=np.float64) * factor
+    return factor, offset
+
+
+def fold_standard_scaler(scaler) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Fold a fitted StandardScaler into (factor, offset) so that
+    scaler.transform(x) == x * factor + offset, computed in float32.
+    """
+    factor, offset = _standard_scaler_terms(scaler)
+    return factor.astype(np.float32), offset.astype(np.float32)
+
+
+def fold_scaler_and_pca(scaler, pca) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Fold a fitted StandardScaler followed by a fitted PCA into (weight, bias) so that
+    pca.transform(scaler.transform(x)) == x @ weight + bias, computed in float32.
+    """
+    factor, offset = _standard_scaler_terms(scaler)
+    components = np.asarray(pca.components_, dtype=np.float64)
+    if pca.whiten:
+        components = components / np.sqrt(pca.explained_variance_)[:, np.newaxis]
+    weight = (components * factor).T
+    bias = (offset - pca.mean_) @ components.T
+    return weight.astype(np.float32), bias.astype(np.float32)
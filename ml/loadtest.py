@@ -0,0 +1,283 @@
+"""
+Load generator and latency benchmark for the ML socket service.
+
+Opens N simulated learners against the service. Each one streams hand landmark frames
+at a fixed fps over req_handsign and periodically sends req_autocomp text, the way the
+site does. Frames either replay a landmark CSV (landmark_{i}_{x,y,z} columns, as in the
+training data) or come from a synthetic hand; every pose is held for a while with small
+jitter, like a learner holding a sign.
+
+Round-trip latency is measured per event. Hand sign responses are matched to frames by
+the echoed 'frame' id. Each client keeps at most one autocomplete request outstanding.
+Frames that get no response are counted as unanswered. These are not errors: the server
+stays silent for superseded frames, low-confidence predictions and repeats suppressed by
+smoothing. The 'dropped' counter reported by the server is summed separately.
+
+Usage:
+    python loadtest.py --spawn --clients 50 --duration 30
+    python loadtest.py --url http://localhost:15100 --clients 200 --fps 30 --csv heldout.csv --json run.json
+
+--spawn starts `python main.py` on a free local port (using .env) and waits for /ready.
+Requires the asyncio socket.io client: pip install "python-socketio[asyncio_client]".
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+import numpy as np
+import socketio
+
+from landmarks import FEATURE_COLUMNS, LANDMARK_COORDS, NUM_LANDMARKS, encode_binary_landmarks
+
+# Approximate MediaPipe landmarks of an open right hand (normalized image coordinates)
+OPEN_HAND = np.array([
+    [0.50, 0.90, 0.00],
+    [0.42, 0.85, -0.01], [0.36, 0.78, -0.02], [0.32, 0.71, -0.03], [0.29, 0.65, -0.04],
+    [0.43, 0.62, -0.01], [0.42, 0.52, -0.02], [0.41, 0.46, -0.03], [0.40, 0.41, -0.04],
+    [0.50, 0.60, -0.01], [0.50, 0.49, -0.02], [0.50, 0.42, -0.03], [0.50, 0.36, -0.04],
+    [0.56, 0.62, -0.01], [0.57, 0.52, -0.02], [0.58, 0.46, -0.03], [0.58, 0.41, -0.04],
+    [0.62, 0.66, -0.01], [0.64, 0.58, -0.02], [0.65, 0.53, -0.03], [0.66, 0.49, -0.04],
+], dtype=np.float32)
+# Landmark indices of each finger, base joint first
+FINGERS = [(1, 2, 3, 4), (5, 6, 7, 8), (9, 10, 11, 12), (13, 14, 15, 16), (17, 18, 19, 20)]
+AUTOCOMPLETE_TEXTS = ['h', 'he', 'hel', 'hello', 'hello w', 'i am', 'thank', 'thank you', 'nice to me', 'good morn']
+
+
+def synthetic_pose(rng: np.random.Generator) -> np.ndarray:
+    """A hand pose with random finger curls, position and size."""
+    pose = OPEN_HAND.copy()
+    for finger in FINGERS:
+        base = pose[finger[0]]
+        pose[list(finger[1:])] = base + (pose[list(finger[1:])] - base) * rng.uniform(0.2, 1.0)
+    center = pose[0]
+    pose[:, :2] = (pose[:, :2] - center[:2]) * rng.uniform(0.7, 1.3) + center[:2] + rng.uniform(-0.15, 0.15, 2)
+    return pose
+
+
+def load_poses(csv_path: str) -> np.ndarray:
+    import pandas as pd
+    data = pd.read_csv(csv_path)[FEATURE_COLUMNS].dropna().to_numpy(dtype=np.float32)
+    # Columns are all x, then all y, then all z: back to (frames, 21, 3)
+    return data.reshape(len(data), len(LANDMARK_COORDS), NUM_LANDMARKS).transpose(0, 2, 1).copy()
+
+
+def encode_frame(points: np.ndarray, fmt: str):
+    if fmt == 'json':
+        return [{'x': float(x), 'y': float(y), 'z': float(z)} for x, y, z in points]
+    return encode_binary_landmarks(points, fmt)
+
+
+class EventStats:
+    def __init__(self):
+        self.sent = 0
+        self.answered = 0
+        self.errors = 0
+        self.latencies_ms: list[float] = []
+
+    def report(self, duration: float) -> dict:
+        latencies = np.array(self.latencies_ms) if self.latencies_ms else np.zeros(1)
+        return {
+            'sent': self.sent,
+            'answered': self.answered,
+            'unanswered': self.sent - self.answered,
+            'errors': self.errors,
+            'throughput': self.answered / duration,
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p95_ms': float(np.percentile(latencies, 95)),
+            'p99_ms': float(np.percentile(latencies, 99)),
+        }
+
+
+class SimulatedLearner:
+    def __init__(self, index: int, args, stats: dict, poses: np.ndarray | None):
+        self.index = index
+        self.args = args
+        self.stats = stats
+        self.poses = poses
+        self.rng = np.random.default_rng(args.seed + index)
+        self.client = socketio.AsyncClient(reconnection=False)
+        self.pending_frames: dict[int, float] = {}
+        self.pending_autocomplete: float | None = None
+        self.server_dropped = 0
+        self.client.on('res_handsign', self._on_hand_sign)
+        self.client.on('res_autocomp', self._on_autocomplete)
+
+    def _on_hand_sign(self, data):
+        sent_at = self.pending_frames.pop(data.get('frame'), None)
+        if sent_at is not None:
+            self.stats['req_handsign'].answered += 1
+            self.stats['req_handsign'].latencies_ms.append((time.perf_counter() - sent_at) * 1000)
+        self.server_dropped = max(self.server_dropped, data.get('dropped', 0))
+
+    def _on_autocomplete(self, data):
+        if self.pending_autocomplete is not None:
+            self.stats['req_autocomp'].answered += 1
+            self.stats['req_autocomp'].latencies_ms.append((time.perf_counter() - self.pending_autocomplete) * 1000)
+            self.pending_autocomplete = None
+
+    def _next_pose(self) -> np.ndarray:
+        if self.poses is not None:
+            return self.poses[self.rng.integers(len(self.poses))]
+        return synthetic_pose(self.rng)
+
+    async def run(self, stop_at: float):
+        self.stats['connect'].sent += 1
+        start = time.perf_counter()
+        try:
+            await self.client.connect(self.args.url, transports=['websocket'], wait_timeout=10)
+        except Exception:
+            self.stats['connect'].errors += 1
+            return
+        self.stats['connect'].answered += 1
+        self.stats['connect'].latencies_ms.append((time.perf_counter() - start) * 1000)
+
+        interval = 1.0 / self.args.fps
+        next_frame = time.perf_counter()
+        next_autocomplete = next_frame + random.uniform(0, self.args.autocomp_interval)
+        frame_id, pose, hold = 0, self._next_pose(), 0
+        try:
+            while time.perf_counter() < stop_at:
+                # Hold each pose for a while, with small per-frame jitter
+                if hold <= 0:
+                    pose, hold = self._next_pose(), self.rng.integers(self.args.hold_frames // 2, self.args.hold_frames + 1)
+                hold -= 1
+                points = pose + self.rng.normal(0, self.args.jitter, pose.shape).astype(np.float32)
+
+                frame_id += 1
+                self.pending_frames[frame_id] = time.perf_counter()
+                self.stats['req_handsign'].sent += 1
+                try:
+                    await self.client.emit('req_handsign', {'landmarks': encode_frame(points, self.args.format), 'frame': frame_id})
+                except Exception:
+                    self.stats['req_handsign'].errors += 1
+                    break
+
+                now = time.perf_counter()
+                if self.args.autocomp_interval > 0 and now >= next_autocomplete:
+                    next_autocomplete = now + self.args.autocomp_interval
+                    if self.pending_autocomplete is None or now - self.pending_autocomplete > self.args.timeout:
+                        self.pending_autocomplete = now
+                        self.stats['req_autocomp'].sent += 1
+                        try:
+                            await self.client.emit('req_autocomp', {'text': random.choice(AUTOCOMPLETE_TEXTS)})
+                        except Exception:
+                            self.stats['req_autocomp'].errors += 1
+
+                # Fixed schedule, so a slow emit does not lower the frame rate
+                next_frame += interval
+                await asyncio.sleep(max(0.0, next_frame - time.perf_counter()))
+            # Let in-flight responses arrive
+            await asyncio.sleep(min(self.args.timeout, 1.0))
+        finally:
+            await self.client.disconnect()
+
+
+async def run_load(args, poses: np.ndarray | None) -> dict:
+    stats = defaultdict(EventStats)
+    learners = [SimulatedLearner(i, args, stats, poses) for i in range(args.clients)]
+    start = time.perf_counter()
+    stop_at = start + args.ramp + args.duration
+
+    async def start_learner(learner: SimulatedLearner):
+        # Spread connections over the ramp-up period
+        await asyncio.sleep(args.ramp * learner.index / max(1, args.clients))
+        await learner.run(stop_at)
+
+    await asyncio.gather(*(start_learner(learner) for learner in learners))
+    duration = time.perf_counter() - start
+    return {
+        'clients': args.clients,
+        'fps': args.fps,
+        'format': args.format,
+        'duration_s': duration,
+        'events': {event: event_stats.report(duration) for event, event_stats in sorted(stats.items())},
+        'server_dropped_frames': sum(learner.server_dropped for learner in learners),
+    }
+
+
+def print_report(report: dict):
+    print(f"\n{report['clients']} clients at {report['fps']} fps ({report['format']} frames), "
+          f"{report['duration_s']:.1f} s")
+    print(f"{'event':<14}{'sent':>9}{'answered':>10}{'unanswered':>12}{'errors':>8}{'per s':>9}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for event, r in report['events'].items():
+        print(f"{event:<14}{r['sent']:>9}{r['answered']:>10}{r['unanswered']:>12}{r['errors']:>8}"
+              f"{r['throughput']:>9.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}")
+    print(f"Frames dropped by the server (superseded before inference): {report['server_dropped_frames']}")
+
+
+def spawn_server(timeout: float) -> tuple[subprocess.Popen, str]:
+    """Start main.py on a free local port and wait until every model has finished loading."""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    env = dict(os.environ, WEBSOCKET_HOST='127.0.0.1', WEBSOCKET_PORT=str(port), VERBOSE='False')
+    server = subprocess.Popen([sys.executable, 'main.py'], cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"main.py exited with code {server.returncode}")
+        try:
+            with urllib.request.urlopen(f'{url}/ready', timeout=1):
+                return server, url
+        except urllib.error.HTTPError as e:
+            models = json.loads(e.read() or b'{}').get('models', {})
+            states = {name: model.get('state') for name, model in models.items()}
+            if models and all(state in ('ready', 'failed') for state in states.values()):
+                print(f"Warning: some models failed to load, their requests will go unanswered: {states}")
+                return server, url
+        except OSError:
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    raise SystemExit(f"main.py was not ready after {timeout:.0f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default=f"http://localhost:{os.getenv('WEBSOCKET_PORT', '15100')}")
+    parser.add_argument('--spawn', action='store_true', help='Start a local main.py server for the run')
+    parser.add_argument('--clients', type=int, default=10)
+    parser.add_argument('--fps', type=float, default=30, help='Hand sign frames per second per client')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds of full load, after the ramp-up')
+    parser.add_argument('--ramp', type=float, default=2, help='Seconds over which clients connect')
+    parser.add_argument('--format', choices=['json', 'f32', 'i16'], default='json', help='Landmark payload encoding')
+    parser.add_argument('--csv', help='Landmark CSV to replay instead of synthetic hands')
+    parser.add_argument('--hold-frames', type=int, default=45, help='Frames each pose is held for')
+    parser.add_argument('--jitter', type=float, default=0.002, help='Per-frame landmark noise')
+    parser.add_argument('--autocomp-interval', type=float, default=3.0, help='Seconds between req_autocomp (0 disables)')
+    parser.add_argument('--timeout', type=float, default=5.0, help='Seconds before an autocomplete request is given up')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='Also write the report to this JSON file')
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    poses = load_poses(args.csv) if args.csv else None
+    server = None
+    if args.spawn:
+        server, args.url = spawn_server(timeout=300)
+    try:
+        report = asyncio.run(run_load(args, poses))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
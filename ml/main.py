@@ -1,11 +1,21 @@
-import json
+import asyncio
 import time
 import socketio
 import uvicorn
 import os
+import numpy as np
 from dotenv import load_dotenv
-from model_handsign import hand_sign_recognizer # New import
 from model_autocomplete import auto_complete_model # New import
+from handsign_backends import create_backend, stage_latency
+from shadow import ShadowEvaluator
+from hot_reload import ModelReloader
+from batching import AutoCompleteBatchScheduler, HandSignBatchScheduler, FrameDroppedError, QueueFullError
+from executor import ModelExecutor
+from landmarks import NUM_FEATURES, decode_binary_landmarks, to_feature_row
+from frame_cache import PredictionCache
+from smoothing import SmootherRegistry, default_smoothing_config
+from readiness import ModelLoader, health_app
+from metrics import Counter, Gauge
 from utils import log_info, log_warning, log_error, log_received_message, log_sending_message
 
 # Load environment variables from .env file
@@ -13,76 +23,299 @@ load_dotenv()
 
 # Initialize Socket.IO server
 sio_server = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins="*")
-sio_app = socketio.ASGIApp(sio_server)
 
 verbose_str = os.getenv("VERBOSE", "True")
 verbose = True if verbose_str.lower() == "true" else False
 
+# Service-level metrics, exported with all the others on /metrics
+connected_sids: set[str] = set()
+connected_clients = Gauge('socketio_connected_clients', 'Currently connected Socket.IO sessions', fn=lambda: len(connected_sids))
+events_received = {
+    event: Counter('socketio_events_received_total', 'Socket.IO events received from clients', labels={'event': event})
+    for event in ('connect', 'disconnect', 'req_handsign', 'req_handsign_config', 'req_autocomp')
+}
+events_sent = {
+    event: Counter('socketio_events_sent_total', 'Socket.IO events sent to clients', labels={'event': event})
+    for event in ('connection_ack', 'res_handsign', 'res_handsign_config', 'res_autocomp')
+}
+low_confidence_total = Counter('handsign_low_confidence_total', 'Hand sign predictions below HANDSIGN_MIN_CONFIDENCE')
+stale_suggestions_total = Counter(
+    'autocomplete_stale_suggestions_total', 'Finished autocomplete results not sent because a newer request had arrived')
+# Number of the latest autocomplete request of each session
+auto_complete_requests: dict[str, int] = {}
+
+# Inference runs on bounded per-model worker pools, never on the event loop
+hand_sign_executor = ModelExecutor(
+    "handsign",
+    max_workers=int(os.getenv("HANDSIGN_WORKERS", "2")),
+    verbose=verbose,
+)
+auto_complete_executor = ModelExecutor(
+    "autocomplete",
+    max_workers=int(os.getenv("AUTOCOMPLETE_WORKERS", "1")),
+    verbose=verbose,
+)
+
+# Near-identical consecutive frames from a session reuse its last prediction
+prediction_cache = PredictionCache(max_distance=float(os.getenv("HANDSIGN_REUSE_MAX_DISTANCE", "0.005")))
+
+# Per-session temporal smoothing and emission policy; clients may override the defaults
+# (labels are filled in once the hand sign backend has loaded)
+hand_sign_smoothers = SmootherRegistry([], default_smoothing_config())
+hand_sign_min_confidence = float(os.getenv("HANDSIGN_MIN_CONFIDENCE", "0.63"))
+
+# New versions of the hand sign model files are loaded, verified and swapped in without a restart
+event_loop: asyncio.AbstractEventLoop | None = None
+
+def on_hand_sign_model_swap(backend):
+    # Cached predictions came from the previous version
+    if event_loop is not None:
+        event_loop.call_soon_threadsafe(prediction_cache.clear)
+
+hand_sign_reloader = ModelReloader(
+    poll_seconds=float(os.getenv("HANDSIGN_RELOAD_POLL_SECONDS", "2")),
+    on_swap=on_hand_sign_model_swap,
+    verbose=verbose,
+)
+
+def load_hand_sign_model():
+    # Hand sign backend is selected at runtime; an optional candidate backend is shadow-evaluated on sampled frames
+    backend = create_backend(os.getenv("HANDSIGN_BACKEND", "tflite"))
+    if not backend.is_ready:
+        raise RuntimeError(f"Hand sign backend '{backend.name}' could not load its model files")
+    hand_sign_smoothers.labels = backend.labels
+    # New versions are warmed up on the serving workers, which each keep their own interpreter
+    hand_sign_reloader.watch(backend, hand_sign_executor.run_on_each_worker)
+
+    shadow_backend_name = os.getenv("HANDSIGN_SHADOW_BACKEND", "")
+    predict_batch = backend.predict_batch
+    if shadow_backend_name:
+        shadow = ShadowEvaluator(
+            backend,
+            create_backend(shadow_backend_name),
+            sample_rate=float(os.getenv("HANDSIGN_SHADOW_SAMPLE_RATE", "0.05")),
+            verbose=verbose,
+        )
+        if shadow.candidate.is_ready:
+            hand_sign_reloader.watch(shadow.candidate)
+        predict_batch = shadow.predict_batch
+
+    hand_sign_reloader.start()
+    return predict_batch
+
+def warm_up_hand_sign_model(predict_batch):
+    # Every worker thread builds its own interpreter on first use, so warm each of them up
+    hand_sign_executor.run_on_each_worker(warm_up_hand_sign_worker, predict_batch)
+
+def warm_up_hand_sign_worker(predict_batch):
+    # The first calls allocate interpreter tensors; cover a single frame and a full batch
+    for rows in (1, hand_sign_scheduler.max_batch_size):
+        predict_batch([np.zeros(NUM_FEATURES, dtype=np.float32)] * rows)
+
+# Models load and warm up on background threads after the server starts; until then their requests are dropped
+hand_sign_loader = ModelLoader("handsign", load_hand_sign_model, warm_up_hand_sign_model, verbose=verbose)
+auto_complete_loader = ModelLoader("autocomplete", auto_complete_model.load, lambda model: model.warmup(), verbose=verbose)
+
+def start_model_loaders():
+    global event_loop
+    event_loop = asyncio.get_running_loop()
+    hand_sign_reloader.install_signal_handler()
+    hand_sign_loader.start()
+    auto_complete_loader.start()
+
+def predict_hand_sign_batch(frames):
+    return hand_sign_loader.get()(frames)
+
+# Frames from all clients are gathered into one batched interpreter call
+hand_sign_scheduler = HandSignBatchScheduler(
+    predict_hand_sign_batch,
+    executor=hand_sign_executor,
+    max_batch_size=int(os.getenv("HANDSIGN_BATCH_MAX_SIZE", "32")),
+    max_wait_ms=float(os.getenv("HANDSIGN_BATCH_MAX_WAIT_MS", "3")),
+    # Frames waiting for a batch before new ones are rejected (two full batches by default)
+    max_queue_depth=int(os.getenv("HANDSIGN_MAX_QUEUE", "64")),
+    verbose=verbose,
+)
+
+def predict_auto_completion_batch(requests, cancelled=None):
+    return auto_complete_loader.get().predict_batch(requests, cancelled=cancelled)
+
+# Concurrent autocomplete requests from all clients share one padded language model pass;
+# a client's newer text replaces its queued request and cancels its running one
+auto_complete_scheduler = AutoCompleteBatchScheduler(
+    predict_auto_completion_batch,
+    executor=auto_complete_executor,
+    max_batch_size=int(os.getenv("AUTOCOMPLETE_BATCH_MAX_SIZE", "16")),
+    max_wait_ms=float(os.getenv("AUTOCOMPLETE_BATCH_MAX_WAIT_MS", "5")),
+    max_queue_depth=int(os.getenv("AUTOCOMPLETE_MAX_QUEUE", "32")),
+    verbose=verbose,
+)
+
+# Socket.IO plus plain HTTP /health, /ready and /metrics routes on the same port
+sio_app = socketio.ASGIApp(sio_server, other_asgi_app=health_app, on_startup=start_model_loaders)
+
 @sio_server.event
 async def connect(sid, environ):
     log_info(f"Client {sid} connected", verbose)
+    events_received['connect'].inc()
+    connected_sids.add(sid)
     ack_data = {'message': 'Successfully connected to ML service!', 'sid': sid}
     log_sending_message(sid, 'connection_ack', ack_data, verbose)
     await sio_server.emit('connection_ack', ack_data, room=sid)
+    events_sent['connection_ack'].inc()
 
 @sio_server.event
 async def disconnect(sid):
     log_info(f"Client {sid} disconnected", verbose)
+    events_received['disconnect'].inc()
+    connected_sids.discard(sid)
     # No room cleanup needed as we are not using custom rooms anymore
+    prediction_cache.forget(sid)
+    hand_sign_smoothers.forget(sid)
+    auto_complete_model.forget(sid)
+    auto_complete_scheduler.forget(sid)
+    auto_complete_requests.pop(sid, None)
+    dropped = hand_sign_scheduler.forget(sid)
+    if dropped:
+        log_info(f"Client {sid}: {dropped} stale hand sign frames were dropped during the session", verbose)
 
 # Channel for hand sign recognition
 @sio_server.on('req_handsign')
 async def handle_hand_sign_detection(sid, data):
     log_received_message(sid, 'req_handsign', data, verbose)
+    events_received['req_handsign'].inc()
     # Save the timestamp of the request in milliseconds
     start_time = time.time() * 1000
-    
+
+    if not hand_sign_loader.is_ready:
+        log_warning(f"Client {sid}: Hand sign model is not ready ({hand_sign_loader.state}). Frame dropped.", verbose, sample='handsign_not_ready', sid=sid)
+        return # Silent: Do not emit to client
+
+    decode_start = time.perf_counter()
     landmarks = data.get('landmarks')
+    # Optional client-side frame id, echoed back so the client can match responses to frames
+    frame_id = data.get('frame')
 
     if landmarks is None: # landmarks can be an empty list if no hand detected
-        log_warning(f"Client {sid}: 'landmarks' field missing in req_handsign payload. No action taken.", verbose)
+        log_warning(f"Client {sid}: 'landmarks' field missing in req_handsign payload. No action taken.", verbose, sample='handsign_landmarks_missing', sid=sid)
         return # Silent: Do not emit to client
     
     if not landmarks: # If landmarks list is empty (e.g. no hand detected by client)
-        log_info(f"Client {sid}: No landmarks received for hand sign detection. No action taken.", verbose)
+        log_info(f"Client {sid}: No landmarks received for hand sign detection. No action taken.", verbose, sample='handsign_no_landmarks', sid=sid)
+        return # Silent: Do not emit to client
+
+    if isinstance(landmarks, (bytes, bytearray)): # Packed frame sent as a socket.io binary attachment
+        try:
+            landmarks = decode_binary_landmarks(landmarks, data.get('format'), data.get('scale'))
+        except (ValueError, TypeError) as e:
+            log_warning(f"Client {sid}: Invalid binary landmarks in req_handsign payload: {e}. No action taken.", verbose, sample='handsign_invalid_landmarks', sid=sid)
+            return # Silent: Do not emit to client
+
+    features = to_feature_row(landmarks)
+    if features is None:
+        log_warning(f"Client {sid}: Landmarks in req_handsign payload are incomplete or malformed. No action taken.", verbose, sample='handsign_invalid_landmarks', sid=sid)
         return # Silent: Do not emit to client
+    stage_latency['decode'].observe((time.perf_counter() - decode_start) * 1e6)
 
     try:
-        predicted_char, max_prob = hand_sign_recognizer.predict(landmarks)
+        prediction = prediction_cache.lookup(sid, features)
+        if prediction is None:
+            prediction = await hand_sign_scheduler.submit(sid, features)
+            if sid not in connected_sids:
+                return # Silent: disconnected while its frame was in a running batch; keep no state for it
+            prediction_cache.store(sid, features, prediction)
+    except FrameDroppedError:
+        return # Silent: a newer frame from this client replaced this one
+    except QueueFullError as e:
+        log_warning(f"Client {sid}: {e}. Hand sign frame dropped.", verbose, sample='handsign_queue_full', sid=sid)
+        return # Silent: Do not emit to client
     except Exception as e:
-        log_error(f"Client {sid}: Error during hand sign prediction: {e}. No action taken for client.", verbose)
+        log_error(f"Client {sid}: Error during hand sign prediction: {e}. No action taken for client.", verbose, sample='handsign_prediction_error', sid=sid)
         return # Silent: Do not emit to client
 
-    if max_prob < float(os.getenv("HANDSIGN_MIN_CONFIDENCE", "0.63")):
-        log_warning(f"Client {sid}: Hand sign prediction probability is too low ({max_prob}). No action taken for client.", verbose)
+    if prediction is None:
+        log_warning(f"Client {sid}: Hand sign prediction returned None. No action taken for client.", verbose, sample='handsign_no_prediction', sid=sid)
         return # Silent: Do not emit to client
 
+    # Stabilize over the session's recent frames and decide whether this result should be emitted
+    smoothed = hand_sign_smoothers.get(sid).update(prediction.probs, hand_sign_min_confidence)
+    if smoothed is None:
+        if prediction.prob < hand_sign_min_confidence:
+            low_confidence_total.inc()
+            log_warning(f"Client {sid}: Hand sign prediction probability is too low ({prediction.prob}). No action taken for client.", verbose, sample='handsign_low_confidence', sid=sid)
+        return # Silent: low confidence, or the stabilized letter has not changed
+    predicted_char, max_prob = smoothed
+
     # Calculate the inference time in milliseconds
     end_time = time.time() * 1000
     inference_time = end_time - start_time
-    if predicted_char is not None:
-        response_data = {'time': int(end_time), 'pred': predicted_char, 'prob': max_prob, 'infer': int(inference_time)}
-        log_sending_message(sid, 'res_handsign', response_data, verbose)
-        await sio_server.emit('res_handsign', response_data, room=sid)
-    else:
-        log_warning(f"Client {sid}: Hand sign prediction returned None. No action taken for client.", verbose)
-        # Silent: Do not emit to client
+    response_data = {'time': int(end_time), 'pred': predicted_char, 'prob': max_prob, 'infer': int(inference_time),
+                     'dropped': hand_sign_scheduler.dropped_frames(sid), 'model': prediction.version}
+    if frame_id is not None:
+        response_data['frame'] = frame_id
+    log_sending_message(sid, 'res_handsign', response_data, verbose)
+    emit_start = time.perf_counter()
+    await sio_server.emit('res_handsign', response_data, room=sid)
+    stage_latency['emit'].observe((time.perf_counter() - emit_start) * 1e6)
+    events_sent['res_handsign'].inc()
+
+# Per-session smoothing and emission parameters for hand sign results
+@sio_server.on('req_handsign_config')
+async def handle_hand_sign_config(sid, data):
+    log_received_message(sid, 'req_handsign_config', data, verbose)
+    events_received['req_handsign_config'].inc()
+    if not isinstance(data, dict):
+        log_warning(f"Client {sid}: req_handsign_config payload must be an object. No action taken.", verbose)
+        return # Silent: Do not emit to client
+
+    try:
+        config = hand_sign_smoothers.configure(sid, data)
+    except ValueError as e:
+        log_warning(f"Client {sid}: Invalid req_handsign_config payload: {e}. No action taken.", verbose)
+        return # Silent: Do not emit to client
+
+    response_data = {'config': config.as_dict()}
+    log_sending_message(sid, 'res_handsign_config', response_data, verbose)
+    await sio_server.emit('res_handsign_config', response_data, room=sid)
+    events_sent['res_handsign_config'].inc()
 
 # Channel for auto-completion
 @sio_server.on('req_autocomp')
 async def handle_auto_completion(sid, data):
     log_received_message(sid, 'req_autocomp', data, verbose)
+    events_received['req_autocomp'].inc()
     current_text = data.get('text')
 
+    if not auto_complete_loader.is_ready:
+        log_warning(f"Client {sid}: Auto-completion model is not ready ({auto_complete_loader.state}). Request dropped.", verbose, sample='autocomplete_not_ready', sid=sid)
+        return # Silent: Do not emit to client
+
     if current_text is None:
         log_warning(f"Client {sid}: 'text' field missing in req_autocomp payload. No action taken.", verbose)
         return # Silent: Do not emit to client
 
+    request_number = auto_complete_requests[sid] = auto_complete_requests.get(sid, 0) + 1
     try:
-        suggestions = auto_complete_model.predict(current_text)
-        response_data = {'suggestions': suggestions}
+        suggestions = await auto_complete_scheduler.submit(sid, (current_text, sid))
+        if auto_complete_requests.get(sid) != request_number:
+            stale_suggestions_total.inc()
+            return # Silent: computed for text the client has already changed
+        # The text the suggestions were computed for, so the client can discard them if its text moved on
+        response_data = {'suggestions': suggestions.words, 'text': current_text}
+        if suggestions.replace:
+            # Corrections replace the end of the text; clients that do not say they handle it would append them
+            if data.get('fuzzy'):
+                response_data['replace'] = suggestions.replace
+            else:
+                response_data['suggestions'] = []
         log_sending_message(sid, 'res_autocomp', response_data, verbose)
         await sio_server.emit('res_autocomp', response_data, room=sid)
+        events_sent['res_autocomp'].inc()
+    except FrameDroppedError:
+        return # Silent: a newer request from this client replaced this one, or it disconnected
+    except QueueFullError as e:
+        log_warning(f"Client {sid}: {e}. Auto-completion request dropped.", verbose, sample='autocomplete_queue_full', sid=sid)
+        # Silent: Do not emit to client
     except Exception as e:
         log_error(f"Client {sid}: Error during auto-completion: {e}. No action taken for client.", verbose)
         # Silent: Do not emit to client
@@ -94,8 +327,6 @@ if __name__ == "__main__":
 
     log_info(f"Starting ML WebSocket server on {host}:{port}")
     log_info(f"Verbose logging: {verbose}", verbose)
-    # Ensure models are loaded (or at least attempted to load)
-
-    _ = hand_sign_recognizer 
-    _ = auto_complete_model
-    uvicorn.run("main:sio_app", host=host, port=port, reload=False) 
\ No newline at end of file
+    # Models are loaded in the background once the server is up; see /ready for their state
+    # Pass the app object itself: an import string would import this module a second time (duplicate metrics)
+    uvicorn.run(sio_app, host=host, port=port, reload=False) 
\ No newline at end of file
@@ -0,0 +1,110 @@
+import bisect
+import threading
+
+# Minimal in-process metrics. Every metric registers itself here on creation.
+# Metrics sharing a name (one per label value, e.g. stage="decode") are exported as one family.
+_registry = []
+
+
+def _format_labels(labels: dict[str, str] | None, **extra: str) -> str:
+    pairs = {**(labels or {}), **extra}
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in pairs.values())
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name: str, description: str, labels: dict[str, str] | None = None):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._value = 0
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    def samples(self) -> list[str]:
+        return [f'{self.name}{_format_labels(self.labels)} {self._value}']
+
+
+class Gauge:
+    """A value that is either set directly or computed on demand by fn."""
+    type = 'gauge'
+
+    def __init__(self, name: str, description: str, fn=None, labels: dict[str, str] | None = None):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self._fn = fn
+        self._value = 0
+        _registry.append(self)
+
+    def set(self, value: float):
+        self._value = value
+
+    @property
+    def value(self) -> float:
+        return self._fn() if self._fn is not None else self._value
+
+    def samples(self) -> list[str]:
+        return [f'{self.name}{_format_labels(self.labels)} {self.value}']
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name: str, description: str, buckets: list[float], labels: dict[str, str] | None = None):
+        self.name = name
+        self.description = description
+        self.labels = labels
+        self.buckets = sorted(buckets)
+        # One slot per upper bound, plus the +Inf overflow slot
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[slot] += 1
+            self._sum += value
+            self._count += 1
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        # Prometheus buckets are cumulative
+        lines, cumulative = [], 0
+        for bound, slot_count in zip([str(b) for b in self.buckets] + ['+Inf'], counts):
+            cumulative += slot_count
+            lines.append(f'{self.name}_bucket{_format_labels(self.labels, le=bound)} {cumulative}')
+        lines.append(f'{self.name}_sum{_format_labels(self.labels)} {total}')
+        lines.append(f'{self.name}_count{_format_labels(self.labels)} {count}')
+        return lines
+
+
+def render_prometheus() -> str:
+    """Every registered metric in the Prometheus text exposition format (version 0.0.4)."""
+    families: dict[str, list] = {}
+    for metric in _registry:
+        families.setdefault(metric.name, []).append(metric)
+    lines = []
+    for name, metrics in families.items():
+        lines.append(f'# HELP {name} {metrics[0].description}')
+        lines.append(f'# TYPE {name} {metrics[0].type}')
+        for metric in metrics:
+            lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
@@ -1,150 +1,458 @@
+import copy
 import os
 import re
+import time
 import numpy as np
 from collections import Counter
+from typing import NamedTuple
 
-# Load corpus and build frequency counter
-with open("big.txt", "r", encoding="utf-8") as f:
-    words = re.findall(r'\w+', f.read().lower())
-freqs = Counter(words)
-
-# Keep only the most common 10,000 words
-most_common_words = [word for word, _ in freqs.most_common(1500)]
-
-
-# ------------------------ Trie Implementation ------------------------
-
-class TrieNode:
-    def __init__(self):
-        self.children = {}
-        self.is_end_of_word = False
-
-class Trie:
-    def __init__(self):
-        self.root = TrieNode()
-
-    def insert(self, word):
-        node = self.root
-        for char in word:
-            if char not in node.children:
-                node.children[char] = TrieNode()
-            node = node.children[char]
-        node.is_end_of_word = True
-
-    def search(self, prefix):
-        node = self.root
-        for char in prefix:
-            if char not in node.children:
-                return []
-            node = node.children[char]
-        return self._find_words_from_node(node, prefix)
-
-    def _find_words_from_node(self, node, prefix):
-        words = []
-        if node.is_end_of_word:
-            words.append(prefix)
-        for char, child_node in node.children.items():
-            words.extend(self._find_words_from_node(child_node, prefix + char))
-        return words
+from completion_index import CompletionIndex
+from kv_cache import (SessionKVCache, kv_cache_computed_tokens_total, kv_cache_reused_tokens_total,
+                      shared_prefix_length)
+from metrics import Histogram
+from ngram_table import NgramTable
+from utils import log_info, log_warning
 
-    def is_word_complete(self, word):
-        node = self.root
-        for char in word:
-            if char not in node.children:
-                return False
-            node = node.children[char]
-        return node.is_end_of_word
-
-# Create and populate the trie
-trie = Trie()
-for word in most_common_words:
-    trie.insert(word)
+# Suggestion latency split by path: word completion (index lookup), typo correction (fuzzy index
+# search), n-gram table or language model next word
+path_latency = {
+    path: Histogram('autocomplete_latency_ms', 'Autocomplete suggestion latency by path (ms)',
+                    [0.01, 0.05, 0.1, 0.5, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500], labels={'path': path})
+    for path in ('trie', 'fuzzy', 'ngram', 'lm')
+}
+
+
+class Suggestions(NamedTuple):
+    words: list[str]    # Appended to the text, once its last `replace` characters are removed
+    replace: int = 0    # Characters at the end of the text the words replace (typo corrections)
+
+
+# ------------------------ Vocabulary ------------------------
+
+def corpus_words(corpus_path: str) -> list[str]:
+    """The words of a corpus in order, lower-cased."""
+    with open(corpus_path, "r", encoding="utf-8") as f:
+        return re.findall(r'\w+', f.read().lower())
+
+def count_words(corpus_path: str) -> Counter:
+    """Word frequencies of a corpus, lower-cased."""
+    return Counter(corpus_words(corpus_path))
+
+def load_vocabulary(corpus_path: str, vocabulary_size: int | None = None, top_k: int = 3,
+                    ngram_top_k: int = 7, ngram_min_count: int = 2) -> CompletionIndex:
+    """
+    Read the corpus, count word frequencies and index the most common words (all of them by default).
+    The index carries the corpus's n-gram table (ngram_table.py) unless ngram_top_k is 0.
+    """
+    words = corpus_words(corpus_path)
+    index = CompletionIndex.from_counts(Counter(words), top_k, vocabulary_size)
+    if ngram_top_k > 0:
+        index.extras = NgramTable.build(index, words, ngram_top_k, ngram_min_count).arrays
+    return index
 
 # ------------------------ Suggestion Logic ------------------------
 
-def get_suggestions(prefix, trie, freqs, max_suggestions=3):
+def get_suggestions(prefix, index, max_suggestions=3):
     """
-    Get autocomplete suggestions from the trie based on a prefix.
-    Returns the most frequent matches up to max_suggestions.
+    Get autocomplete suggestions from the completion index based on a prefix.
+    Returns the most frequent matches up to max_suggestions (at most the index's top_k).
     """
-    suggestions = trie.search(prefix)
-    ranked_suggestions = [(word, freqs[word]) for word in suggestions if word in freqs]
-    ranked_suggestions.sort(key=lambda x: x[1], reverse=True)
-    ranked_suggestions = [word for word, _ in ranked_suggestions]
-    return ranked_suggestions[:max_suggestions]
+    return index.search(prefix)[:max_suggestions]
 
 # ------------------------ Model + Prediction ------------------------
 
 os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
 
 from dotenv import load_dotenv
-import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
 
 def seed_everything(seed=42):
     """Set random seeds for reproducibility."""
+    import torch
     torch.manual_seed(seed)
     np.random.seed(seed)
     if torch.cuda.is_available():
         torch.cuda.manual_seed_all(seed)
 
-# Set seeds and load .env
-seed_everything()
 load_dotenv()
 
+LM_MODES = ("sample", "rank")
+LM_BACKENDS = ("fp32", "int8")
+
 class AutoCompleteModel:
-    def __init__(self, model_name="roneneldan/TinyStories-33M", device=None):
-        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-        self.model = AutoModelForCausalLM.from_pretrained(model_name).to(self.device)
+    """
+    Word completion (index over a text corpus) plus next-word suggestions (causal LM).
+    Nothing heavy happens at construction: torch, transformers and the corpus are
+    only loaded by load(), which the server runs on a background thread.
+    """
+
+    def __init__(self, model_name="roneneldan/TinyStories-33M", device=None, backend=None, threads=None):
+        self.model_name = model_name
+        self.device = device
+        # Language model weights: "fp32", or "int8" (linear layers dynamically quantized to int8, CPU only)
+        self.backend = (backend or os.getenv("AUTOCOMPLETE_LM_BACKEND", "fp32")).lower()
+        if self.backend not in LM_BACKENDS:
+            log_warning(f"Unknown AUTOCOMPLETE_LM_BACKEND '{self.backend}', expected one of {LM_BACKENDS}. Using fp32.")
+            self.backend = "fp32"
+        # Intra-op threads torch uses for a forward pass on CPU (0 = torch's default, one per core)
+        self.threads = int(os.getenv("AUTOCOMPLETE_TORCH_THREADS", "0")) if threads is None else threads
+        self.corpus_path = os.getenv("AUTOCOMPLETE_CORPUS_PATH", "big.txt")
+        # Prebuilt index (build_vocabulary.py), memory-mapped; the corpus is only read if it is missing
+        self.index_path = os.getenv("AUTOCOMPLETE_INDEX_PATH", "./models_store/vocabulary.idx")
+        # Words indexed for completion, most frequent first (0 = the whole corpus vocabulary)
+        self.vocabulary_size = int(os.getenv("AUTOCOMPLETE_VOCABULARY_SIZE", "0")) or None
+        # Only the most frequent indexed words count as complete (and get next-word suggestions);
+        # rarer ones, often fragments like "th", are still completed (0 = every indexed word)
+        self.complete_words = max(0, int(os.getenv("AUTOCOMPLETE_COMPLETE_WORDS", "1500")))
+        self.complete_min_count = 1
+        # Word completions returned per request, ranked by corpus frequency
+        self.num_completions = max(1, int(os.getenv("AUTOCOMPLETE_COMPLETIONS", "1")))
+        # Next-word suggestions: "sample" draws several short generations, "rank" reads the
+        # most likely next tokens from a single forward pass (deterministic)
+        self.lm_mode = os.getenv("AUTOCOMPLETE_LM_MODE", "sample").lower()
+        if self.lm_mode not in LM_MODES:
+            log_warning(f"Unknown AUTOCOMPLETE_LM_MODE '{self.lm_mode}', expected one of {LM_MODES}. Using sample.")
+            self.lm_mode = "sample"
+        self.rank_candidates = max(1, int(os.getenv("AUTOCOMPLETE_RANK_CANDIDATES", "20")))
+        # A word nothing in the index starts with (often a misrecognized letter) is corrected to the
+        # indexed words whose start is within this many edits of it (0 = off), searching for at most
+        # the budget; words shorter than fuzzy_min_length are too ambiguous to correct
+        self.fuzzy_max_edits = max(0, int(os.getenv("AUTOCOMPLETE_FUZZY_MAX_EDITS", "1")))
+        self.fuzzy_budget_ms = float(os.getenv("AUTOCOMPLETE_FUZZY_BUDGET_MS", "10"))
+        self.fuzzy_min_length = 3
+        # Next words are answered from the index's n-gram table when its top continuation of the last
+        # two (or else one) words is at least this likely, in a context seen at least this often
+        self.use_ngrams = os.getenv("AUTOCOMPLETE_NGRAM", "True").lower() == "true"
+        self.ngram_min_probability = float(os.getenv("AUTOCOMPLETE_NGRAM_MIN_PROBABILITY", "0.4"))
+        self.ngram_min_count = int(os.getenv("AUTOCOMPLETE_NGRAM_MIN_COUNT", "5"))
+        # Language model state of each session's last prompt, so a growing text only runs its new tokens
+        self.kv_cache = SessionKVCache(int(float(os.getenv("AUTOCOMPLETE_KV_CACHE_MB", "64")) * 2**20))
+        # Token id -> the word it starts (None if it does not start an alphabetic word), filled lazily
+        self._token_words: dict[int, str | None] = {}
+        self.index = None
+        self.ngrams = None
+        self.tokenizer = None
+        self.model = None
+
+    def load(self):
+        if os.path.exists(self.index_path):
+            log_info(f"Mapping autocomplete vocabulary index: {self.index_path}")
+            self.index = CompletionIndex.open(self.index_path, self.num_completions)
+        else:
+            log_warning(f"Autocomplete vocabulary index not found at {self.index_path} (build it with build_vocabulary.py). "
+                        f"Building the vocabulary from: {self.corpus_path}")
+            self.index = load_vocabulary(self.corpus_path, self.vocabulary_size, self.num_completions)
+        log_info(f"Autocomplete vocabulary: {len(self.index)} words ({self.index.nbytes / 2**20:.1f} MiB)")
+        self.complete_min_count = self.index.min_count_of_top(self.complete_words)
+        if self.use_ngrams:
+            self.ngrams = NgramTable.from_index(self.index)
+            if self.ngrams is None:
+                log_warning("The autocomplete vocabulary index has no n-gram table (rebuild it with build_vocabulary.py). "
+                            "Every next word comes from the language model.")
+
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+        seed_everything()
+        if self.threads > 0:
+            torch.set_num_threads(self.threads)
+        self.device = self.device or ("cuda" if torch.cuda.is_available() else "cpu")
+        if self.backend == "int8" and self.device != "cpu":
+            log_warning(f"The int8 autocomplete backend runs on CPU only. Using fp32 on {self.device}.")
+            self.backend = "fp32"
+        log_info(f"Loading autocomplete language model: {self.model_name} ({self.device}, {self.backend}, "
+                 f"{torch.get_num_threads()} threads)")
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        self.model = AutoModelForCausalLM.from_pretrained(self.model_name).to(self.device)
         self.model.eval()
+        if self.backend == "int8":
+            # Weights of every linear layer are stored as int8; activations are quantized on the fly
+            # per batch. Embeddings and layer norms stay fp32. (torch.ao is deprecated in favour of
+            # torchao, which is not a dependency here.)
+            from torch.ao.quantization import quantize_dynamic
+            self.model = quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        return self
 
-    def predict(self, text, max_new_tokens=2, num_suggestions=7):
+    def warmup(self):
+        # One completion and one correction through the index, one next-word generation through the LM
+        # and one padded batch
+        self.predict("th")
+        self.predict("thw")
+        self.predict("the")
+        self.predict_batch([("the", None), ("once upon a time", None)])
+
+    def predict(self, text, session=None, max_new_tokens=2, num_suggestions=7):
         """
         Generate autocomplete suggestions for incomplete or complete last word.
-        Returns only alphabetic characters (no numbers, no punctuation).
+        Returns Suggestions of only alphabetic characters (no numbers, no punctuation). If no
+        indexed word starts with the last word, the suggestions are corrections of it and
+        replace its characters.
+        With a session id, the language model state of the session's previous text is reused.
         """
-        text = text.lower().strip()
-        text = re.sub(r'[^a-zA-Z\s]', '', text)
-
-        words = text.split()
-        if not words:
-            return []
-
-        last_word = words[-1]
-        if not trie.is_word_complete(last_word):
-            # Incomplete word: suggest only the completion
-            suggestions = get_suggestions(last_word, trie, freqs)
-            if not suggestions:
-                return []
-            best = suggestions[0]
-            completed = best[len(last_word):]
-            completed = re.sub(r'[^a-zA-Z]', '', completed)
-            return [completed] if completed else []
-        else:
-            # Complete word: suggest the next word using language model
-            prefix = text
-            input_ids = self.tokenizer.encode(prefix, return_tensors="pt").to(self.device)
-            with torch.no_grad():
-                outputs = self.model.generate(
-                    input_ids,
-                    max_new_tokens=max_new_tokens,
-                    do_sample=True,
-                    top_k=50,
-                    top_p=0.95,
-                    temperature=0.5,
-                    pad_token_id=self.tokenizer.eos_token_id,
-                    num_return_sequences=num_suggestions
-                )
-            suggestions = []
-            for output in outputs:
-                decoded = self.tokenizer.decode(output, skip_special_tokens=True)
-                suggestion = decoded[len(prefix):].strip()
-                next_word = suggestion.split()[0] if suggestion else ""
-                next_word = re.sub(r'[^a-zA-Z]', '', next_word)
-                if next_word:
-                    suggestions.append(next_word)
-            return list(dict.fromkeys([" " + s for s in suggestions if s]))
-
-
-auto_complete_model = AutoCompleteModel()
\ No newline at end of file
+        return self.predict_batch([(text, session)], max_new_tokens, num_suggestions)[0]
+
+    def predict_batch(self, requests, max_new_tokens=2, num_suggestions=7, cancelled=None):
+        """
+        predict() for a list of (text, session) requests, typically from different sessions.
+        Completions are looked up one by one; the prompts that need next-word suggestions
+        share one left-padded language model pass. cancelled(i), if given, is checked before
+        the model runs for request i; a cancelled request gets an empty result.
+        """
+        results = [Suggestions([]) for _ in requests]
+        prompts = []
+        for i, (text, session) in enumerate(requests):
+            raw_text = text.lower()
+            text = raw_text.strip()
+            text = re.sub(r'[^a-zA-Z\s]', '', text)
+
+            words = text.split()
+            if not words:
+                continue
+
+            last_word = words[-1]
+            if not self.is_word_complete(last_word):
+                # Incomplete word: suggest only the completion
+                start = time.perf_counter()
+                completions = self._complete_word(last_word)
+                if (completions or not self.fuzzy_max_edits or len(last_word) < self.fuzzy_min_length
+                        or not raw_text.endswith(last_word)):
+                    results[i] = Suggestions(completions)
+                    path_latency['trie'].observe((time.perf_counter() - start) * 1000)
+                else:
+                    # Nothing starts with it, so it likely has a wrong letter: suggest whole corrected words
+                    corrections = self._correct_word(last_word)
+                    results[i] = Suggestions(corrections, len(last_word) if corrections else 0)
+                    path_latency['fuzzy'].observe((time.perf_counter() - start) * 1000)
+            else:
+                # Complete word: suggest the next word, from the n-gram table if it is confident, else the LM
+                if self.ngrams is not None:
+                    start = time.perf_counter()
+                    next_words = self.ngrams.suggest(words, self.ngram_min_probability, self.ngram_min_count,
+                                                     num_suggestions)
+                    if next_words:
+                        results[i] = Suggestions([" " + word for word in next_words])
+                        path_latency['ngram'].observe((time.perf_counter() - start) * 1000)
+                        continue
+                prompts.append((i, text, session))
+
+        if cancelled is not None:
+            prompts = [prompt for prompt in prompts if not cancelled(prompt[0])]
+        if prompts:
+            start = time.perf_counter()
+            is_cancelled = None if cancelled is None else lambda p: cancelled(prompts[p][0])
+            suggestions = self._next_words([(text, session) for _, text, session in prompts],
+                                           max_new_tokens, num_suggestions, is_cancelled)
+            elapsed = (time.perf_counter() - start) * 1000
+            for (i, _, _), words in zip(prompts, suggestions):
+                results[i] = Suggestions(words)
+                path_latency['lm'].observe(elapsed)
+        return results
+
+    def _complete_word(self, last_word):
+        completions = []
+        for word in get_suggestions(last_word, self.index, self.num_completions):
+            completed = re.sub(r'[^a-zA-Z]', '', word[len(last_word):])
+            if completed:
+                completions.append(completed)
+        return completions
+
+    def is_word_complete(self, word):
+        """Whether word is one of the complete_words most frequent indexed words."""
+        return self.index.is_word_complete(word, self.complete_min_count)
+
+    def _correct_word(self, word):
+        """The most frequent alphabetic indexed words starting within fuzzy_max_edits edits of word."""
+        # Ask for extra matches, as some are left out for non-letters
+        matches = self.index.fuzzy_search(word, self.fuzzy_max_edits, 4 * self.num_completions, self.fuzzy_budget_ms)
+        return [match for match, _ in matches if match.isascii() and match.isalpha()][:self.num_completions]
+
+    def forget(self, session):
+        self.kv_cache.forget(session)
+
+    def _next_words(self, prompts, max_new_tokens, num_suggestions, cancelled=None):
+        encoded = self._encode_prompts(prompts)
+        try:
+            if self.lm_mode == "rank":
+                return self._rank_next_words(encoded, num_suggestions)
+            # Prompts are sampled one after another, so a prompt cancelled meanwhile is skipped
+            return [[] if cancelled is not None and cancelled(p)
+                    else self._sample_next_words(prefix, token_ids, past, max_new_tokens, num_suggestions)
+                    for p, ((prefix, _), (token_ids, past, _)) in enumerate(zip(prompts, encoded))]
+        finally:
+            for (_, session), (token_ids, past, logits) in zip(prompts, encoded):
+                if session is not None:
+                    self.kv_cache.put(session, token_ids, past, logits)
+
+    def _encode_prompts(self, prompts):
+        """
+        Run the model over every (prefix, session) prompt and return (token ids, past_key_values,
+        next-token logits) for each. Tokens shared with the session's previous prompt come from its
+        cached state; where the text diverged (a deleted or edited word), the cached state is
+        cropped back first. The remaining tokens of all prompts run as one batch.
+        """
+        encoded = [None] * len(prompts)
+        rows, pending = [], []
+        for i, (prefix, session) in enumerate(prompts):
+            token_ids = self.tokenizer.encode(prefix)
+            cached = self.kv_cache.take(session) if session is not None else None
+            past, reused = None, 0
+            if cached is not None:
+                shared = shared_prefix_length(cached.token_ids, token_ids)
+                if shared == len(token_ids) == len(cached.token_ids):
+                    kv_cache_reused_tokens_total.inc(shared)
+                    encoded[i] = (token_ids, cached.past_key_values, cached.logits)
+                    continue
+                # At least the last token is run again, for its logits
+                reused = min(shared, len(token_ids) - 1)
+                if reused > 0:
+                    past = cached.past_key_values
+                    if reused < len(cached.token_ids):
+                        past.crop(reused - len(cached.token_ids))
+            kv_cache_reused_tokens_total.inc(reused)
+            kv_cache_computed_tokens_total.inc(len(token_ids) - reused)
+            rows.append((past, reused, token_ids[reused:]))
+            pending.append((i, token_ids))
+
+        if rows:
+            logits, caches = self._forward_rows(rows, keep_cache=True)
+            for row, (i, token_ids) in enumerate(pending):
+                encoded[i] = (token_ids, caches[row], logits[row])
+        return encoded
+
+    def _forward_rows(self, rows, keep_cache=False):
+        """
+        One forward pass over rows of (past_key_values or None, cached length, new token ids) and
+        return the next-token logits of every row, plus each row's own extended cache if keep_cache.
+
+        Rows of different lengths are left-padded into one batch: each cache is padded to the
+        longest one, the new tokens to the longest run of new tokens, and the attention mask hides
+        the padding while position ids keep every row's own positions. Last tokens line up at the
+        end, so the last position holds every row's logits.
+        """
+        import torch
+        from transformers import DynamicCache
+        with torch.no_grad():
+            if len(rows) == 1 and keep_cache:
+                # The row's cache is extended in place, no padding needed
+                past, _, new_ids = rows[0]
+                output = self.model(torch.tensor([new_ids], device=self.device), past_key_values=past, use_cache=True)
+                return output.logits[:, -1], [output.past_key_values]
+
+            cached_length = max(length for _, length, _ in rows)
+            new_length = max(len(new_ids) for _, _, new_ids in rows)
+            input_ids = torch.full((len(rows), new_length), self.tokenizer.eos_token_id or 0, device=self.device)
+            attention_mask = torch.zeros((len(rows), cached_length + new_length), dtype=torch.long, device=self.device)
+            position_ids = torch.zeros((len(rows), new_length), dtype=torch.long, device=self.device)
+            for row, (_, length, new_ids) in enumerate(rows):
+                attention_mask[row, cached_length - length:cached_length] = 1
+                attention_mask[row, cached_length + new_length - len(new_ids):] = 1
+                input_ids[row, new_length - len(new_ids):] = torch.tensor(new_ids, device=self.device)
+                position_ids[row, new_length - len(new_ids):] = torch.arange(length, length + len(new_ids))
+
+            batch_cache = None
+            if cached_length > 0:
+                batch_cache = DynamicCache(config=self.model.config)
+                template = next(past for past, length, _ in rows if length > 0)
+                for layer_idx, layer in enumerate(template.layers):
+                    shape = (len(rows), layer.keys.shape[1], cached_length, layer.keys.shape[3])
+                    keys = layer.keys.new_zeros(shape)
+                    values = layer.values.new_zeros(shape)
+                    for row, (past, length, _) in enumerate(rows):
+                        if length > 0:
+                            keys[row, :, cached_length - length:] = past.layers[layer_idx].keys[0]
+                            values[row, :, cached_length - length:] = past.layers[layer_idx].values[0]
+                    batch_cache.update(keys, values, layer_idx)
+
+            output = self.model(input_ids, attention_mask=attention_mask, position_ids=position_ids,
+                                past_key_values=batch_cache, use_cache=True)
+            if not keep_cache:
+                return output.logits[:, -1], None
+
+            # Split the batch cache back into one unpadded cache per row
+            caches = []
+            for row in range(len(rows)):
+                valid = attention_mask[row].bool()
+                cache = DynamicCache(config=self.model.config)
+                for layer_idx, layer in enumerate(output.past_key_values.layers):
+                    cache.update(layer.keys[row:row + 1, :, valid], layer.values[row:row + 1, :, valid], layer_idx)
+                caches.append(cache)
+            return output.logits[:, -1], caches
+
+    def _sample_next_words(self, prefix, token_ids, past, max_new_tokens, num_suggestions):
+        import torch
+        input_ids = torch.tensor([token_ids], device=self.device)
+        # generate() runs the last prompt token itself and extends the cache for every sequence,
+        # so it gets its own copy, one row per sequence
+        generation_cache = None
+        if len(token_ids) > 1:
+            generation_cache = copy.deepcopy(past)
+            generation_cache.crop(-1)
+            generation_cache.batch_repeat_interleave(num_suggestions)
+        with torch.no_grad():
+            outputs = self.model.generate(
+                input_ids,
+                past_key_values=generation_cache,
+                max_new_tokens=max_new_tokens,
+                do_sample=True,
+                top_k=50,
+                top_p=0.95,
+                temperature=0.5,
+                pad_token_id=self.tokenizer.eos_token_id,
+                num_return_sequences=num_suggestions
+            )
+        suggestions = []
+        for output in outputs:
+            decoded = self.tokenizer.decode(output, skip_special_tokens=True)
+            suggestion = decoded[len(prefix):].strip()
+            next_word = suggestion.split()[0] if suggestion else ""
+            next_word = re.sub(r'[^a-zA-Z]', '', next_word)
+            if next_word:
+                suggestions.append(next_word)
+        return list(dict.fromkeys([" " + s for s in suggestions if s]))
+
+    def _token_word(self, token_id):
+        # The word a token starts: it must open a new word (leading space) and be purely alphabetic
+        if token_id not in self._token_words:
+            text = self.tokenizer.decode([token_id])
+            word = text.strip()
+            starts_word = text[:1].isspace() and re.fullmatch(r'[a-zA-Z]+', word)
+            self._token_words[token_id] = word if starts_word else None
+        return self._token_words[token_id]
+
+    def _rank_next_words(self, encoded, num_suggestions):
+        """
+        Rank next words by the probability of their first token, from each prompt's logits.
+        Tokens that only start a word (not in the vocabulary index) are extended with their
+        most likely continuation in a second pass, batched over all prompts.
+        """
+        import torch
+        scores = [{} for _ in encoded]
+        partial = []  # (prompt, word, prob), one per continuation row
+        rows = []
+        for prompt, (token_ids, past, logits) in enumerate(encoded):
+            probs = torch.softmax(logits.float(), dim=-1)
+            top_probs, top_ids = probs.topk(min(self.rank_candidates, probs.shape[-1]))
+            for prob, token_id in zip(top_probs.tolist(), top_ids.tolist()):
+                word = self._token_word(token_id)
+                if word is None:
+                    continue
+                if self.is_word_complete(word.lower()):
+                    scores[prompt][word] = max(scores[prompt].get(word, 0.0), prob)
+                else:
+                    partial.append((prompt, word, prob))
+                    rows.append((past, len(token_ids), [token_id]))
+
+        if rows:
+            logits, _ = self._forward_rows(rows)
+            next_probs = torch.softmax(logits.float(), dim=-1)
+            next_best, next_ids = next_probs.max(dim=-1)
+            for (prompt, word, prob), next_prob, next_id in zip(partial, next_best.tolist(), next_ids.tolist()):
+                rest = self.tokenizer.decode([next_id])
+                if re.fullmatch(r'[a-zA-Z]+', rest):
+                    word += rest  # The word continues
+                # Otherwise the next token starts a new word or is punctuation: the piece is a word by itself
+                scores[prompt][word] = max(scores[prompt].get(word, 0.0), prob * next_prob)
+
+        return [[" " + word for word in sorted(words, key=words.get, reverse=True)[:num_suggestions]]
+                for words in scores]
+
+
+auto_complete_model = AutoCompleteModel()
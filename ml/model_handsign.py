@@ -2,21 +2,79 @@ import os
 os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
 
 import pickle
+import threading
+from typing import NamedTuple
 import numpy as np
-import pandas as pd
-from sklearn.preprocessing import StandardScaler
-import tensorflow as tf
 import os
 from dotenv import load_dotenv
 
+# Prefer a standalone TFLite runtime; the full tensorflow package takes seconds to import
+try:
+    from ai_edge_litert.interpreter import Interpreter
+except ImportError:
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+
 from utils import log_info, log_error, log_warning
+from landmarks import NUM_FEATURES, new_feature_buffer, fill_feature_row, fold_standard_scaler
+from handsign_backends import HandSignBackend, HandSignPrediction, StageTimer, model_version
 
 # Load environment variables from .env file
 # This ensures that if this module is imported, .env is loaded.
 # It might be loaded multiple times if other modules also call it, but python-dotenv handles this gracefully.
 load_dotenv()
 
-class HandSignRecognizer:
+# Supported model precisions: env var holding the model path, and its default
+MODEL_PRECISIONS = {
+    'float32': ("TFLITE_MODEL_PATH", "./models_store/model.tflite"),
+    'float16': ("TFLITE_FP16_MODEL_PATH", "./models_store/model_fp16.tflite"),
+    'int8': ("TFLITE_INT8_MODEL_PATH", "./models_store/model_int8.tflite"),
+}
+
+def resolve_model_path(precision: str) -> str:
+    """Path of the TFLite model for a precision, falling back to the float32 model if that file is missing."""
+    if precision not in MODEL_PRECISIONS:
+        log_warning(f"Unknown HANDSIGN_MODEL_PRECISION '{precision}', expected one of {list(MODEL_PRECISIONS)}. Using float32.")
+        precision = 'float32'
+    env_var, default_path = MODEL_PRECISIONS[precision]
+    path = os.getenv(env_var, default_path)
+    if precision != 'float32' and not os.path.exists(path):
+        log_warning(f"{precision} hand sign model not found at {path} (build it with quantize_handsign.py). Using float32.")
+        env_var, default_path = MODEL_PRECISIONS['float32']
+        path = os.getenv(env_var, default_path)
+    return path
+
+class _LoadedModel(NamedTuple):
+    version: str
+    model_content: bytes       # TFLite flatbuffer, shared by every thread's interpreter
+    scale_factor: np.ndarray   # Folded scaler (and int8 input quantization): x * factor + offset
+    scale_offset: np.ndarray
+
+class _InterpreterState:
+    """TFLite interpreter plus scratch buffers owned by a single thread (interpreters are not thread-safe)."""
+
+    def __init__(self, model_content: bytes, version: str | None = None):
+        self.version = version
+        self.interpreter = Interpreter(model_content=model_content)
+        self.interpreter.allocate_tensors()
+        input_details = self.interpreter.get_input_details()[0]
+        output_details = self.interpreter.get_output_details()[0]
+        self.input_index = input_details['index']
+        self.output_index = output_details['index']
+        # Fully integer-quantized models take and return int8 tensors: (scale, zero_point)
+        self.input_dtype = np.dtype(input_details['dtype'])
+        self.input_quantization = input_details['quantization'] if self.input_dtype.kind == 'i' else None
+        self.output_quantization = output_details['quantization'] if np.dtype(output_details['dtype']).kind == 'i' else None
+        # Preallocated input rows, reused for every batch
+        self.input_buffer = new_feature_buffer()
+        self.quantized_buffer = np.zeros(self.input_buffer.shape, dtype=self.input_dtype) if self.input_quantization else None
+        self.input_rows = 1
+
+class HandSignRecognizer(HandSignBackend):
+    name = "tflite"
     _instance = None
 
     def __new__(cls, *args, **kwargs):
@@ -28,114 +86,171 @@ class HandSignRecognizer:
     def __init__(self):
         if self._initialized:
             return
-        self._scaler: StandardScaler | None = None
-        self._interpreter: tf.lite.Interpreter | None = None
-        self._input_details = None
-        self._output_details = None
+        self.precision = os.getenv("HANDSIGN_MODEL_PRECISION", "float32")
+        # Each worker thread lazily builds its own interpreter from the active model's bytes
+        self._local = threading.local()
         self._initialize_model()
         self._initialized = True
 
     def _initialize_model(self):
         try:
-            # Get paths from environment variables with fallback defaults
-            scaler_model_path = os.getenv("SCALER_MODEL_PATH", "./models_store/scaler.pkl")
-            tflite_model_path = os.getenv("TFLITE_MODEL_PATH", "./models_store/model.tflite")
-            
-            # Load scaler
-            log_info(f"Loading scaler model from: {scaler_model_path}")
-            with open(scaler_model_path, 'rb') as f:
-                self._scaler = pickle.load(f)
-            
-            # Load TFLite model
-            log_info(f"Loading TFLite model from: {tflite_model_path}")
-            self._interpreter = tf.lite.Interpreter(model_path=tflite_model_path)
-            self._interpreter.allocate_tensors()
-            
-            # Get input and output details
-            self._input_details = self._interpreter.get_input_details()
-            self._output_details = self._interpreter.get_output_details()
-            
-            log_info("Hand Sign Recognizer TFLite model loaded successfully.")
-            
+            self._active = self._load_model()
         except FileNotFoundError as e:
             log_error(f"Error loading model components for HandSignRecognizer: {e}. Please ensure model files are at specified paths in .env")
-            self._interpreter = None
         except Exception as e:
             log_error(f"An unexpected error occurred during HandSignRecognizer model initialization: {e}")
-            self._interpreter = None
-            
-    def _preprocess_landmarks(self, landmarks_data: list[dict]) -> pd.DataFrame | None:
-        if not landmarks_data or not isinstance(landmarks_data, list):
-            log_warning("Landmarks data is empty or not a list in _preprocess_landmarks.")
-            return None
-        
-        # Ensure all expected features are present, even if None, for consistent DataFrame columns
-        expected_coords = ['x', 'y', 'z']
-        
-        # Create feature dictionary with expected structure
-        feature_dict = {f'landmark_{i}_{coord}': landmarks_data[i].get(coord) for coord in expected_coords for i in range(21)}
-        
-        df = pd.DataFrame([feature_dict])
-        
-        # Check for any missing values that could cause issues with scaler
-        if df.isnull().values.any():
-            log_warning(f"DataFrame contains null values after preprocessing: \n{df[df.isnull().any(axis=1)]}")
-        
-        return df
 
-    def predict(self, landmarks_data: list[dict]) -> tuple[str, float] | None:
-        if self._interpreter is None or self._scaler is None:
-            log_error("HandSignRecognizer model or scaler not loaded. Cannot predict.")
-            return None
-        
-        if not landmarks_data:
-            log_warning("Received empty landmarks_data for prediction.")
-            return None
+    @property
+    def model_files(self) -> list[str]:
+        return [os.getenv("SCALER_MODEL_PATH", "./models_store/scaler.pkl"), resolve_model_path(self.precision)]
+
+    def _load_model(self) -> _LoadedModel:
+        scaler_model_path, tflite_model_path = self.model_files
+
+        # Load scaler and fold it into a float32 multiply-add for the hot path
+        log_info(f"Loading scaler model from: {scaler_model_path}")
+        with open(scaler_model_path, 'rb') as f:
+            scaler_content = f.read()
+        scale_factor, scale_offset = fold_standard_scaler(pickle.loads(scaler_content))
+
+        # Load TFLite model once; an interpreter built here validates it
+        log_info(f"Loading TFLite model from: {tflite_model_path} (runtime: {Interpreter.__module__})")
+        with open(tflite_model_path, 'rb') as f:
+            model_content = f.read()
+        state = _InterpreterState(model_content)
+
+        # For int8 models, fold input quantization into the same multiply-add: q = x / scale + zero_point
+        if state.input_quantization:
+            quant_scale, zero_point = state.input_quantization
+            scale_factor = (scale_factor / quant_scale).astype(np.float32)
+            scale_offset = (scale_offset / quant_scale + zero_point).astype(np.float32)
+
+        version = model_version(model_content, scaler_content)
+        log_info(f"Hand Sign Recognizer TFLite model {version} loaded successfully ({state.input_dtype} input).")
+        return _LoadedModel(version, model_content, scale_factor, scale_offset)
+
+    def _interpreter_state(self, model: _LoadedModel) -> _InterpreterState:
+        # Rebuilt when the thread first sees a new model version
+        state = getattr(self._local, 'state', None)
+        if state is None or state.version != model.version:
+            state = self._local.state = _InterpreterState(model.model_content, model.version)
+        return state
+
+    def _preprocess_landmarks(self, state: _InterpreterState, landmarks_batch: list[list[dict]]) -> tuple[np.ndarray, list[bool]]:
+        rows = len(landmarks_batch)
+        batch = state.input_buffer[:rows]
 
+        # Decode straight into the preallocated buffer, in the scaler's column order
+        valid = []
+        for i, landmarks_data in enumerate(landmarks_batch):
+            if fill_feature_row(landmarks_data, batch[i]):
+                valid.append(True)
+            else:
+                log_warning("Landmarks data is empty, not a list or incomplete in _preprocess_landmarks.",
+                            sample='handsign_invalid_landmarks')
+                batch[i] = 0.0
+                valid.append(False)
+
+        # Rows with missing values cannot be predicted
+        missing = np.flatnonzero(np.isnan(batch).any(axis=1))
+        if len(missing):
+            log_warning(f"{len(missing)} of {rows} feature rows contain null values after preprocessing.",
+                        sample='handsign_null_features')
+            for i in missing:
+                batch[i] = 0.0
+                valid[i] = False
+        return batch, valid
+
+    @staticmethod
+    def _scale_features(model: _LoadedModel, state: _InterpreterState, batch: np.ndarray):
+        # Apply the folded scaler (and input quantization) in place: (x - mean) / scale
+        np.multiply(batch, model.scale_factor, out=batch)
+        np.add(batch, model.scale_offset, out=batch)
+        if state.input_quantization:
+            limits = np.iinfo(state.input_dtype)
+            np.rint(batch, out=batch)
+            np.clip(batch, limits.min, limits.max, out=batch)
+            state.quantized_buffer[:len(batch)] = batch
+
+    @staticmethod
+    def _resize_input(state: _InterpreterState, rows: int) -> int:
+        # Round up to a power of two so a varying batch size does not reallocate on every call
+        bucket = 1 << (rows - 1).bit_length()
+        if bucket != state.input_rows:
+            state.interpreter.resize_tensor_input(state.input_index, [bucket, NUM_FEATURES])
+            state.interpreter.allocate_tensors()
+            state.input_rows = bucket
+        if bucket > len(state.input_buffer):
+            state.input_buffer = new_feature_buffer(bucket)
+            if state.input_quantization:
+                state.quantized_buffer = np.zeros(state.input_buffer.shape, dtype=state.input_dtype)
+        return bucket
+
+    @staticmethod
+    def _label_for_index(index: int) -> str:
+        # Convert numeric prediction to character
+        if index == 26:
+            return "delete"
+        elif index == 27:
+            return "space"
+        elif index == 28:
+            return "autocmp"
+        return chr(index + ord("A"))
+
+    @property
+    def labels(self) -> list[str]:
+        # Label of every output class, in model output order
+        return [self._label_for_index(i) for i in range(29)]
+
+    def _predict_with(self, model: _LoadedModel, landmarks_batch: list[list[dict]]) -> list[HandSignPrediction | None]:
         try:
-            # Preprocess input data
-            processed_data = self._preprocess_landmarks(landmarks_data)
-            if processed_data is None:
-                log_warning("Failed to preprocess landmarks. Cannot predict.")
-                return None
-                
-            # Scale the data using the loaded scaler
-            scaled_data = self._scaler.transform(processed_data)
-            
-            # Convert to float32 for TFLite
-            input_data = np.array(scaled_data, dtype=np.float32)
-            
-            # Set the input tensor
-            self._interpreter.set_tensor(self._input_details[0]['index'], input_data)
-            
-            # Run inference
-            self._interpreter.invoke()
-            
+            timer = StageTimer(self.name)
+            state = self._interpreter_state(model)
+            rows = len(landmarks_batch)
+            bucket = self._resize_input(state, rows)
+
+            # Preprocess and scale input data into float32 rows for TFLite,
+            # zero-padding the batch up to the allocated size
+            batch, valid = self._preprocess_landmarks(state, landmarks_batch)
+            timer.mark('preprocess')
+            self._scale_features(model, state, batch)
+            input_buffer = state.quantized_buffer if state.input_quantization else state.input_buffer
+            input_buffer[rows:bucket] = 0
+            state.interpreter.set_tensor(state.input_index, input_buffer[:bucket])
+            timer.mark('scale')
+
+            # Run inference once for the whole batch
+            state.interpreter.invoke()
+
             # Get the output tensor
-            prediction_array = self._interpreter.get_tensor(self._output_details[0]['index'])
-            
-            # Find the class with highest probability
-            y_single_pred = np.argmax(prediction_array, axis=1)
-            
-            # Get the confidence value (max probability)
-            max_prob = prediction_array[0][y_single_pred[0]]
-            
-            # Convert numeric prediction to character
-            pred_char = ""
-            if y_single_pred[0] == 26:
-                pred_char = "delete"
-            elif y_single_pred[0] == 27:
-                pred_char = "space"
-            elif y_single_pred[0] == 28:
-                pred_char = "autocmp"
-            else:
-                pred_char = chr(y_single_pred[0] + ord("A"))
-                
-            return pred_char, float(max_prob)
-            
+            prediction_array = state.interpreter.get_tensor(state.output_index)[:rows]
+            timer.mark('invoke')
+            if state.output_quantization:
+                quant_scale, zero_point = state.output_quantization
+                prediction_array = (prediction_array.astype(np.float32) - zero_point) * quant_scale
+
+            # Find the class with highest probability and its confidence value
+            y_pred = np.argmax(prediction_array, axis=1)
+            max_probs = prediction_array[np.arange(rows), y_pred]
+
+            results = []
+            for is_valid, index, max_prob, probs in zip(valid, y_pred, max_probs, prediction_array):
+                if not is_valid or np.isnan(max_prob):
+                    results.append(None)
+                else:
+                    results.append(HandSignPrediction(self._label_for_index(int(index)), float(max_prob), probs, model.version))
+            timer.mark('postprocess')
+            return results
+
         except Exception as e:
-            log_error(f"Error during prediction: {e}")
+            log_error(f"Error during prediction: {e}", sample='handsign_prediction_error')
+            return [None] * len(landmarks_batch)
+
+    def predict(self, landmarks_data: list[dict]) -> tuple[str, float] | None:
+        if not landmarks_data:
+            log_warning("Received empty landmarks_data for prediction.", sample='handsign_no_landmarks')
             return None
+        return super().predict(landmarks_data)
 
 # Instantiate the singleton for use in other modules
 hand_sign_recognizer = HandSignRecognizer() 
\ No newline at end of file
@@ -0,0 +1,165 @@
+import pickle
+import threading
+from typing import Any, NamedTuple
+import numpy as np
+import os
+from dotenv import load_dotenv
+
+from utils import log_info, log_error, log_warning # Assuming utils might be needed for logging within model init
+from landmarks import new_feature_buffer, fill_feature_row, fold_scaler_and_pca
+from handsign_backends import HandSignBackend, HandSignPrediction, StageTimer, model_version
+from forest import CompiledForest
+
+# Load environment variables from .env file
+# This ensures that if this module is imported, .env is loaded.
+# It might be loaded multiple times if other modules also call it, but python-dotenv handles this gracefully.
+load_dotenv()
+
+class _LoadedModel(NamedTuple):
+    version: str
+    model: Any                        # Fitted sklearn classifier
+    projection_weight: np.ndarray     # Scaler and PCA folded into a single float32 projection: x @ weight + bias
+    projection_bias: np.ndarray
+    forest: CompiledForest | None     # Forest flattened into node arrays; None falls back to the model's own predict_proba
+
+class HandSignRecognizer(HandSignBackend):
+    name = "rf"
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(HandSignRecognizer, cls).__new__(cls, *args, **kwargs)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(self):
+        if self._initialized:
+            return
+        # Preallocated input rows per worker thread, reused for every batch
+        self._local = threading.local()
+        self._initialize_model()
+        self._initialized = True
+
+    def _initialize_model(self):
+        try:
+            self._active = self._load_model()
+        except FileNotFoundError as e:
+            log_error(f"Error loading model components for HandSignRecognizer: {e}. Please ensure model files are at specified paths in .env (e.g., SCALER_MODEL_PATH).")
+        except Exception as e:
+            log_error(f"An unexpected error occurred during HandSignRecognizer model initialization: {e}")
+
+    @property
+    def model_files(self) -> list[str]:
+        return [
+            os.getenv("SCALER_MODEL_PATH", "./models_store/scaler.pkl"),
+            os.getenv("PCA_MODEL_PATH", "./models_store/pca.pkl"),
+            os.getenv("HAND_SIGN_MODEL_PATH", "./models_store/rf_model_pca.pkl"),
+        ]
+
+    def _load_model(self) -> _LoadedModel:
+        scaler_model_path, pca_model_path, hand_sign_model_path = self.model_files
+        contents = []
+        for description, path in (("scaler", scaler_model_path), ("PCA", pca_model_path),
+                                  ("hand sign", hand_sign_model_path)):
+            log_info(f"Loading {description} model from: {path}")
+            with open(path, 'rb') as f:
+                contents.append(f.read())
+        scaler, pca, model = (pickle.loads(content) for content in contents)
+
+        projection_weight, projection_bias = fold_scaler_and_pca(scaler, pca)
+        forest = None
+        try:
+            forest = CompiledForest(model)
+            log_info(f"Compiled forest: {forest.n_trees} trees, {forest.n_nodes} nodes, "
+                     f"max depth {forest.max_depth}.")
+        except ValueError as e:
+            log_warning(f"{e}; using the model's own predict_proba.")
+
+        version = model_version(*contents)
+        log_info(f"Hand Sign Recognizer pipeline {version} loaded successfully.")
+        return _LoadedModel(version, model, projection_weight, projection_bias, forest)
+
+    def _input_buffer(self, rows: int) -> np.ndarray:
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or len(buffer) < rows:
+            buffer = self._local.buffer = new_feature_buffer(rows)
+        return buffer[:rows]
+
+    def _preprocess_landmarks(self, landmarks_batch: list[list[dict]]) -> tuple[np.ndarray, list[bool]]:
+        # Decode straight into the preallocated buffer, in the scaler's column order:
+        # [f'landmark_{i}_x' for i in range(21)] + [f'landmark_{i}_y' for i in range(21)] + [f'landmark_{i}_z' for i in range(21)]
+        batch = self._input_buffer(len(landmarks_batch))
+        valid = []
+        for i, landmarks_data in enumerate(landmarks_batch):
+            if fill_feature_row(landmarks_data, batch[i]):
+                valid.append(True)
+            else:
+                log_warning("Landmarks data is empty, not a list or incomplete in _preprocess_landmarks.",
+                            sample='handsign_invalid_landmarks')
+                batch[i] = 0.0
+                valid.append(False)
+        
+        # Rows with missing values cannot go through the projection
+        missing = np.flatnonzero(np.isnan(batch).any(axis=1))
+        if len(missing):
+            log_warning(f"{len(missing)} of {len(batch)} feature rows contain null values after preprocessing.",
+                        sample='handsign_null_features')
+            for i in missing:
+                batch[i] = 0.0
+                valid[i] = False
+        return batch, valid
+
+    @staticmethod
+    def _label_for_index(index: int) -> str:
+        if index == 0:
+            return "delete"
+        elif index == 27:
+            return "autocmp"
+        elif index == 28:
+            return "space"
+        return chr(index + ord("A") - 1)
+
+    @property
+    def labels(self) -> list[str]:
+        # Label of every output class, in model output order
+        model = self._active
+        n_classes = len(model.model.classes_) if model is not None else 29
+        return [self._label_for_index(i) for i in range(n_classes)]
+
+    def _predict_with(self, model: _LoadedModel, landmarks_batch: list[list[dict]]) -> list[HandSignPrediction | None]:
+        try:
+            timer = StageTimer(self.name)
+            batch, valid = self._preprocess_landmarks(landmarks_batch)
+            timer.mark('preprocess')
+            # Scaler and PCA in one step
+            processed_data = batch @ model.projection_weight + model.projection_bias
+            timer.mark('scale')
+            if model.forest is not None:
+                prediction_array = model.forest.predict_proba(processed_data)
+            else:
+                prediction_array = model.model.predict_proba(processed_data)
+            timer.mark('invoke')
+            # Confidence is reported as the sigmoid of the forest's vote share
+            confidences = 1/(1+np.exp(-prediction_array))
+            y_pred = np.argmax(prediction_array, axis=1)
+
+            results = []
+            for is_valid, index, probs in zip(valid, y_pred, confidences):
+                if not is_valid:
+                    results.append(None)
+                else:
+                    results.append(HandSignPrediction(self._label_for_index(int(index)), float(probs[index]), probs, model.version))
+            timer.mark('postprocess')
+            return results
+        except Exception as e:
+            log_error(f"Error during prediction pipeline: {e}", sample='handsign_prediction_error')
+            return [None] * len(landmarks_batch)
+
+    def predict(self, landmarks_data: list[dict]) -> tuple[str, float] | None:
+        if not landmarks_data:
+            log_warning("Received empty landmarks_data for prediction.", sample='handsign_no_landmarks')
+            return None # Or a specific code for no input
+        return super().predict(landmarks_data)
+
+# Instantiate the singleton for use in other modules
+hand_sign_recognizer = HandSignRecognizer() 
\ No newline at end of file
@@ -0,0 +1,159 @@
+import numpy as np
+
+from completion_index import CompletionIndex
+from metrics import Counter, Gauge
+
+# Context lengths, longest first: trigrams (two words of context), then bigrams (one word)
+CONTEXT_LENGTHS = (2, 1)
+FIELDS = ('keys', 'offsets', 'next', 'counts', 'totals')
+
+ngram_hits_total = Counter('autocomplete_ngram_hits_total', 'Next-word requests answered from the n-gram table')
+ngram_misses_total = Counter(
+    'autocomplete_ngram_misses_total', 'Next-word requests the n-gram table was not confident about (sent to the LM)')
+ngram_hit_ratio = Gauge(
+    'autocomplete_ngram_hit_ratio', 'Share of next-word requests answered from the n-gram table',
+    fn=lambda: ngram_hits_total.value / max(1, ngram_hits_total.value + ngram_misses_total.value),
+)
+
+
+class NgramTable:
+    """
+    Most frequent next words after every one- and two-word context of a corpus, for
+    answering next-word suggestions without the language model.
+
+    Words are referred to by their id (position) in a CompletionIndex. For each context
+    length there are five flat arrays: the sorted context keys (the word id, or
+    first id * vocabulary size + second id), CSR offsets into the next-word ids and
+    their counts (most frequent first, at most top_k per context), and how often the
+    context was followed by any indexed word. They are stored as extra arrays of the
+    index (index.extras), so the same file holds both and is memory-mapped together.
+    """
+
+    def __init__(self, index: CompletionIndex, arrays: dict[str, np.ndarray]):
+        self.index = index
+        self.arrays = arrays
+        self._levels = {length: tuple(arrays[f'ngram{length}.{field}'] for field in FIELDS)
+                        for length in CONTEXT_LENGTHS}
+        # Memoryviews of everything but the keys, for fast single-element reads (see CompletionIndex)
+        self._views = {length: tuple(memoryview(array) for array in level[1:]) for length, level in self._levels.items()}
+
+    @classmethod
+    def from_index(cls, index: CompletionIndex) -> 'NgramTable | None':
+        """The table stored with an index, or None if the index was built without one."""
+        if not all(f'ngram{length}.{field}' in index.extras for length in CONTEXT_LENGTHS for field in FIELDS):
+            return None
+        return cls(index, index.extras)
+
+    @classmethod
+    def build(cls, index: CompletionIndex, words: list[str], top_k: int = 7, min_count: int = 2) -> 'NgramTable':
+        """
+        Count the continuations of every context in a word sequence (the corpus, tokenized as
+        for the index). Contexts seen fewer than min_count times are left out; only alphabetic
+        words are kept as suggestions, but every indexed word counts towards a context's total.
+        """
+        vocabulary = [index.word(i) for i in range(len(index))]
+        word_ids = {word: i for i, word in enumerate(vocabulary)}
+        ids = np.array([word_ids.get(word, -1) for word in words], dtype=np.int64)
+        # Suggestions are plain letters, like the language model's
+        alphabetic = np.array([word.isascii() and word.isalpha() for word in vocabulary], dtype=bool)
+        size = len(index)
+
+        arrays = {}
+        for length in CONTEXT_LENGTHS:
+            # Context key and next word id at every corpus position with a complete window
+            windows = [ids[offset:len(ids) - length + offset] for offset in range(length + 1)]
+            valid = np.logical_and.reduce([window >= 0 for window in windows])
+            contexts = windows[0][valid]
+            for window in windows[1:-1]:
+                contexts = contexts * size + window[valid]
+            levels = _top_continuations(contexts, windows[-1][valid], alphabetic, top_k, min_count)
+            arrays.update((f'ngram{length}.{field}', array) for field, array in zip(FIELDS, levels))
+        return cls(index, arrays)
+
+    def lookup(self, context: list[str], length: int) -> tuple[list[str], list[int], int] | None:
+        """
+        (next words, their counts, the context's total) after the last length words of context,
+        None if the table has no data for them.
+        """
+        found = self._find(self._context_ids(context), length)
+        if found is None:
+            return None
+        start, end, total = found
+        next_ids, counts = self._views[length][1:3]
+        return [self.index.word(next_ids[i]) for i in range(start, end)], counts[start:end].tolist(), total
+
+    def suggest(self, context: list[str], min_probability: float, min_count: int, limit: int) -> list[str] | None:
+        """
+        Up to limit next words from the longest context the table is confident about: one seen
+        at least min_count times whose most frequent continuation followed it at least
+        min_probability of the time. None if there is none; the caller should then ask the
+        language model.
+        """
+        ids = self._context_ids(context)
+        for length in CONTEXT_LENGTHS:
+            found = self._find(ids, length)
+            if found is None:
+                continue
+            start, end, total = found
+            _, next_ids, counts, _ = self._views[length]
+            if start < end and total >= min_count and counts[start] >= min_probability * total:
+                ngram_hits_total.inc()
+                return [self.index.word(next_ids[i]) for i in range(start, min(end, start + limit))]
+        ngram_misses_total.inc()
+        return None
+
+    def _context_ids(self, context: list[str]) -> list[int]:
+        """Word ids of the last words of context (-1 for words not in the index)."""
+        return [self.index.find(word) for word in context[-max(CONTEXT_LENGTHS):]]
+
+    def _find(self, ids: list[int], length: int) -> tuple[int, int, int] | None:
+        """(start, end, total) of the context made of the last length ids, None if it has no data."""
+        if len(ids) < length or min(ids[-length:]) < 0:
+            return None
+        key = 0
+        for word_id in ids[-length:]:
+            key = key * len(self.index) + word_id
+        keys = self._levels[length][0]
+        offsets, _, _, totals = self._views[length]
+        position = int(keys.searchsorted(key))
+        if position == len(keys) or keys[position] != key:
+            return None
+        return offsets[position], offsets[position + 1], totals[position]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self.arrays.values())
+
+
+def _top_continuations(contexts: np.ndarray, next_ids: np.ndarray, alphabetic: np.ndarray, top_k: int,
+                       min_count: int) -> tuple[np.ndarray, ...]:
+    """The arrays of one context length (see FIELDS) from parallel context key / next word id arrays."""
+    if len(contexts) == 0:
+        return (np.zeros(0, dtype=np.int64), np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32),
+                np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int64))
+    # Count every distinct (context, next word) pair
+    order = np.lexsort((next_ids, contexts))
+    contexts, next_ids = contexts[order], next_ids[order]
+    starts = np.flatnonzero(np.concatenate(([True], (contexts[1:] != contexts[:-1]) | (next_ids[1:] != next_ids[:-1]))))
+    pair_contexts, pair_next = contexts[starts], next_ids[starts]
+    pair_counts = np.diff(np.append(starts, len(contexts)))
+
+    # Contexts and how often each was followed by any word
+    keys, first_pair = np.unique(pair_contexts, return_index=True)
+    totals = np.add.reduceat(pair_counts, first_pair)
+    frequent = totals >= min_count
+    keys, totals = keys[frequent], totals[frequent]
+
+    # Alphabetic continuations of the kept contexts, most frequent first, top_k per context
+    candidates = alphabetic[pair_next] & np.isin(pair_contexts, keys)
+    pair_contexts, pair_next, pair_counts = pair_contexts[candidates], pair_next[candidates], pair_counts[candidates]
+    order = np.lexsort((pair_next, -pair_counts, pair_contexts))
+    pair_contexts, pair_next, pair_counts = pair_contexts[order], pair_next[order], pair_counts[order]
+    rank = np.arange(len(pair_contexts)) - np.searchsorted(pair_contexts, pair_contexts, 'left')
+    kept = rank < top_k
+    pair_contexts, pair_next, pair_counts = pair_contexts[kept], pair_next[kept], pair_counts[kept]
+
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    offsets[1:] = np.searchsorted(pair_contexts, keys, 'right')
+    return (keys.astype(np.int64), offsets, pair_next.astype(np.int32), pair_counts.astype(np.int32),
+            totals.astype(np.int64))
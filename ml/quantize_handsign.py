@@ -0,0 +1,243 @@
+"""
+Build quantized variants of the hand sign TFLite model and compare them with the float32 model.
+
+The float32 network is rebuilt from the weights stored in the .tflite file (it is a stack of
+fully connected layers), or taken from a SavedModel export when --saved-model is given, and
+converted to float16 and/or int8. The int8 model is fully integer-quantized (int8 input and
+output); the recognizer folds the input quantization into its scaler step.
+
+The report compares every model on a held-out landmark CSV (same columns as the training
+data: landmark_{i}_{x,y,z} plus label) for per-frame latency, batched throughput, accuracy
+and agreement with the float32 model.
+
+Usage:
+    python quantize_handsign.py --csv heldout.csv
+    python quantize_handsign.py --csv heldout.csv --precisions int8 --report int8_report.md
+
+Then select a model with HANDSIGN_MODEL_PRECISION=float16 or int8 in .env.
+Requires the full tensorflow package (for the converter).
+"""
+import argparse
+import os
+import pickle
+import time
+
+os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+
+from landmarks import FEATURE_COLUMNS, NUM_FEATURES, fold_standard_scaler
+
+OUTPUT_NAMES = {'float16': 'model_fp16.tflite', 'int8': 'model_int8.tflite'}
+# Label encodings used by the training notebooks, mapped to model output indices
+NUMERIC_LABEL_MAP = {-20: 26, 30: 27}
+NAMED_LABEL_MAP = {'del': 26, 'delete': 26, 'space': 27, 'nothing': 28, 'autocmp': 28}
+
+
+def load_dataset(csv_path: str, scaler_path: str) -> tuple[np.ndarray, np.ndarray]:
+    """Return (scaled float32 features, label indices) from a landmark CSV."""
+    data = pd.read_csv(csv_path)
+    missing = [column for column in FEATURE_COLUMNS + ['label'] if column not in data.columns]
+    if missing:
+        raise SystemExit(f"{csv_path} is missing columns: {missing[:5]}{'...' if len(missing) > 5 else ''}")
+
+    with open(scaler_path, 'rb') as f:
+        factor, offset = fold_standard_scaler(pickle.load(f))
+    features = data[FEATURE_COLUMNS].to_numpy(dtype=np.float32) * factor + offset
+
+    def to_index(label):
+        if isinstance(label, str) and not label.lstrip('-').isdigit():
+            return NAMED_LABEL_MAP.get(label.lower(), ord(label.upper()) - ord('A') if len(label) == 1 else -1)
+        label = int(label)
+        return NUMERIC_LABEL_MAP.get(label, label)
+
+    labels = np.array([to_index(label) for label in data['label']], dtype=np.int64)
+    keep = ~np.isnan(features).any(axis=1)
+    return features[keep], labels[keep]
+
+
+class _DenseStack(tf.Module):
+    def __init__(self, layers: list[tuple[np.ndarray, np.ndarray, str]]):
+        super().__init__()
+        self._layers = [(tf.constant(weight), tf.constant(bias), activation) for weight, bias, activation in layers]
+
+    @tf.function(input_signature=[tf.TensorSpec([None, NUM_FEATURES], tf.float32)])
+    def __call__(self, x):
+        for weight, bias, activation in self._layers:
+            x = tf.matmul(x, weight, transpose_b=True) + bias
+            if activation == 'relu':
+                x = tf.nn.relu(x)
+            elif activation == 'softmax':
+                x = tf.nn.softmax(x)
+        return x
+
+
+def rebuild_from_tflite(model_content: bytes) -> _DenseStack:
+    """Rebuild the float32 network from the fully connected layers stored in a .tflite file."""
+    interpreter = tf.lite.Interpreter(model_content=model_content)
+    interpreter.allocate_tensors()
+    tensors = {t['index']: t for t in interpreter.get_tensor_details()}
+    ops = [op for op in interpreter._get_ops_details() if op['op_name'] != 'DELEGATE']
+
+    layers = []
+    for position, op in enumerate(ops):
+        if op['op_name'] == 'FULLY_CONNECTED':
+            _, weight_index, bias_index = op['inputs']
+            # Keras names fused activations in the output tensor, e.g. ".../Relu;.../BiasAdd"
+            activation = 'relu' if 'relu' in tensors[op['outputs'][0]]['name'].lower() else 'linear'
+            layers.append([interpreter.get_tensor(weight_index), interpreter.get_tensor(bias_index), activation])
+        elif op['op_name'] == 'SOFTMAX' and position == len(ops) - 1 and layers:
+            layers[-1][2] = 'softmax'
+        else:
+            raise SystemExit(f"Cannot rebuild op {op['op_name']} from the .tflite file; pass --saved-model instead.")
+    return _DenseStack([tuple(layer) for layer in layers])
+
+
+def convert(source, precision: str, calibration: np.ndarray) -> bytes:
+    if isinstance(source, str):
+        converter = tf.lite.TFLiteConverter.from_saved_model(source)
+    else:
+        converter = tf.lite.TFLiteConverter.from_concrete_functions([source.__call__.get_concrete_function()], source)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if precision == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif precision == 'int8':
+        def representative_dataset():
+            for row in calibration:
+                yield [row[np.newaxis, :]]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    else:
+        raise ValueError(f"Unsupported precision '{precision}'")
+    return converter.convert()
+
+
+class _Runner:
+    """Runs a .tflite model on scaled features the same way HandSignRecognizer does."""
+
+    def __init__(self, model_content: bytes):
+        self.interpreter = tf.lite.Interpreter(model_content=model_content, num_threads=1)
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.rows = None
+
+    def __call__(self, features: np.ndarray) -> np.ndarray:
+        if self.rows != len(features):
+            self.interpreter.resize_tensor_input(self.input['index'], [len(features), NUM_FEATURES])
+            self.interpreter.allocate_tensors()
+            self.rows = len(features)
+        if np.dtype(self.input['dtype']).kind == 'i':
+            scale, zero_point = self.input['quantization']
+            limits = np.iinfo(self.input['dtype'])
+            features = np.clip(np.rint(features / scale + zero_point), limits.min, limits.max).astype(self.input['dtype'])
+        self.interpreter.set_tensor(self.input['index'], features)
+        self.interpreter.invoke()
+        probs = self.interpreter.get_tensor(self.output['index'])
+        if np.dtype(self.output['dtype']).kind == 'i':
+            scale, zero_point = self.output['quantization']
+            probs = (probs.astype(np.float32) - zero_point) * scale
+        return probs
+
+
+def evaluate(model_content: bytes, features: np.ndarray, labels: np.ndarray, reference: np.ndarray | None,
+             latency_frames: int, batch_size: int) -> dict:
+    runner = _Runner(model_content)
+    predictions = np.concatenate([runner(features[i:i + batch_size]).argmax(axis=1)
+                                  for i in range(0, len(features), batch_size)])
+
+    # Per-frame latency: one row per call, including input quantization
+    timings = []
+    for row in features[:latency_frames]:
+        start = time.perf_counter()
+        runner(row[np.newaxis, :])
+        timings.append((time.perf_counter() - start) * 1e6)
+
+    # Throughput: full batches, repeated for at least half a second
+    batch = np.resize(features, (batch_size, NUM_FEATURES)).astype(np.float32)
+    runner(batch)
+    frames, start = 0, time.perf_counter()
+    while time.perf_counter() - start < 0.5:
+        runner(batch)
+        frames += batch_size
+
+    return {
+        'size_kb': len(model_content) / 1024,
+        'p50_us': float(np.percentile(timings, 50)),
+        'p95_us': float(np.percentile(timings, 95)),
+        'throughput': frames / (time.perf_counter() - start),
+        'accuracy': float(np.mean(predictions == labels)),
+        'agreement': float(np.mean(predictions == reference)) if reference is not None else 1.0,
+        'predictions': predictions,
+    }
+
+
+def write_report(path: str, csv_path: str, rows: int, batch_size: int, results: dict):
+    lines = [
+        "# Hand sign model quantization report",
+        "",
+        f"Held-out data: `{csv_path}` ({rows} frames). Latency: one frame per call; "
+        f"throughput: batches of {batch_size} frames; single interpreter thread.",
+        "",
+        "| Model | Size (KB) | p50 latency (us) | p95 latency (us) | Throughput (frames/s) | Accuracy | Agreement with float32 |",
+        "|---|---|---|---|---|---|---|",
+    ]
+    for name, r in results.items():
+        lines.append(f"| {name} | {r['size_kb']:.1f} | {r['p50_us']:.1f} | {r['p95_us']:.1f} | "
+                     f"{r['throughput']:.0f} | {r['accuracy']:.4f} | {r['agreement']:.4f} |")
+    report = "\n".join(lines) + "\n"
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(report)
+    print(report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--csv', required=True, help='Held-out landmark CSV used for calibration and evaluation')
+    parser.add_argument('--model', default=os.getenv("TFLITE_MODEL_PATH", "./models_store/model.tflite"))
+    parser.add_argument('--scaler', default=os.getenv("SCALER_MODEL_PATH", "./models_store/scaler.pkl"))
+    parser.add_argument('--saved-model', help='SavedModel export of the network (preferred source when available)')
+    parser.add_argument('--precisions', nargs='+', default=['float16', 'int8'], choices=list(OUTPUT_NAMES))
+    parser.add_argument('--out-dir', default='./models_store')
+    parser.add_argument('--report', default='./quantization_report.md')
+    parser.add_argument('--calibration-rows', type=int, default=500, help='Rows used to calibrate int8 ranges')
+    parser.add_argument('--latency-frames', type=int, default=1000)
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    features, labels = load_dataset(args.csv, args.scaler)
+    print(f"Loaded {len(features)} frames from {args.csv}")
+    with open(args.model, 'rb') as f:
+        float_model = f.read()
+
+    source = args.saved_model
+    if source is None:
+        source = rebuild_from_tflite(float_model)
+        # The rebuilt network must reproduce the original before it is worth quantizing
+        difference = np.abs(source(features[:256]).numpy() - _Runner(float_model)(features[:256])).max()
+        if difference > 1e-4:
+            raise SystemExit(f"Rebuilt network differs from {args.model} by {difference:.2e}; pass --saved-model instead.")
+
+    models = {'float32': float_model}
+    for precision in args.precisions:
+        content = convert(source, precision, features[:args.calibration_rows])
+        output_path = os.path.join(args.out_dir, OUTPUT_NAMES[precision])
+        with open(output_path, 'wb') as f:
+            f.write(content)
+        print(f"Wrote {precision} model to {output_path}")
+        models[precision] = content
+
+    results = {}
+    reference = None
+    for name, content in models.items():
+        results[name] = evaluate(content, features, labels, reference, args.latency_frames, args.batch_size)
+        if reference is None:
+            reference = results[name]['predictions']
+    write_report(args.report, args.csv, len(features), args.batch_size, results)
+
+
+if __name__ == "__main__":
+    main()
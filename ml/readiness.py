@@ -0,0 +1,127 @@
+import json
+import threading
+import time
+from typing import Any, Callable
+
+from metrics import render_prometheus
+from utils import log_error, log_info
+
+# Model loading states, in order
+PENDING, LOADING, WARMING, READY, FAILED = 'pending', 'loading', 'warming', 'ready', 'failed'
+
+
+class ModelNotReadyError(RuntimeError):
+    """Raised when a model is used before it has finished loading and warming up."""
+
+
+# Every loader registers itself here, so the readiness route can report all of them
+_loaders: list['ModelLoader'] = []
+
+
+class ModelLoader:
+    """
+    Loads one model on a background thread so the server can accept connections
+    right away. load() returns the loaded model object; warmup(model), if given,
+    runs a first inference so lazy allocations happen before real traffic.
+    The model is only handed out by get() once both steps have succeeded.
+    """
+
+    def __init__(self, name: str, load: Callable[[], Any], warmup: Callable[[Any], Any] | None = None,
+                 verbose: bool = True):
+        self.name = name
+        self._load = load
+        self._warmup = warmup
+        self._verbose = verbose
+        self._model = None
+        self._thread: threading.Thread | None = None
+        self.state = PENDING
+        self.error: str | None = None
+        self.load_seconds: float | None = None
+        self.warmup_ms: float | None = None
+        _loaders.append(self)
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == READY
+
+    def start(self):
+        """Start loading in the background. Calling it again has no effect."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-loader", daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Block until loading has finished (either way). Returns True if the model is ready."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.is_ready
+
+    def get(self) -> Any:
+        """Return the loaded model. Raises ModelNotReadyError until it is warm."""
+        if self.state != READY:
+            raise ModelNotReadyError(f"Model '{self.name}' is not ready ({self.state})")
+        return self._model
+
+    def _run(self):
+        try:
+            self.state = LOADING
+            start = time.perf_counter()
+            model = self._load()
+            self.load_seconds = time.perf_counter() - start
+
+            if self._warmup is not None:
+                self.state = WARMING
+                start = time.perf_counter()
+                self._warmup(model)
+                self.warmup_ms = (time.perf_counter() - start) * 1000
+
+            self._model = model
+            self.state = READY
+            log_info(f"Model '{self.name}' ready (load {self.load_seconds:.2f} s, warmup {self.warmup_ms or 0:.1f} ms)",
+                     self._verbose)
+        except Exception as e:
+            self.error = str(e)
+            self.state = FAILED
+            log_error(f"Model '{self.name}' failed to load: {e}")
+
+    def status(self) -> dict:
+        return {'state': self.state, 'load_seconds': self.load_seconds, 'warmup_ms': self.warmup_ms, 'error': self.error}
+
+
+def readiness() -> dict:
+    """State of every registered model; ready only when all of them are."""
+    return {
+        'ready': all(loader.is_ready for loader in _loaders),
+        'models': {loader.name: loader.status() for loader in _loaders},
+    }
+
+
+async def _send(send, status: int, payload: bytes, content_type: bytes):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', content_type), (b'content-length', str(len(payload)).encode())]})
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+async def _send_json(send, status: int, body: dict):
+    await _send(send, status, json.dumps(body).encode('utf-8'), b'application/json')
+
+
+async def health_app(scope, receive, send):
+    """
+    Plain HTTP routes served next to socket.io:
+    /health answers 200 while the process is up; /ready answers 200 once every model
+    is warm and 503 before that (or if a model failed), with each model's state;
+    /metrics returns every registered metric in the Prometheus text format.
+    """
+    if scope['type'] != 'http':
+        return
+    path = scope['path'].rstrip('/')
+    if path == '/health':
+        await _send_json(send, 200, {'status': 'ok'})
+    elif path == '/ready':
+        report = readiness()
+        await _send_json(send, 200 if report['ready'] else 503, report)
+    elif path == '/metrics':
+        await _send(send, 200, render_prometheus().encode('utf-8'), b'text/plain; version=0.0.4; charset=utf-8')
+    else:
+        await _send_json(send, 404, {'error': 'not found'})
@@ -0,0 +1,87 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from handsign_backends import HandSignBackend, HandSignPrediction
+from metrics import Counter, Gauge, Histogram
+from utils import log_error, log_info
+
+LATENCY_BUCKETS_US = [10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000]
+
+primary_latency_histogram = Histogram(
+    'handsign_primary_latency_us', 'Per-frame latency of the primary hand sign backend on shadow-sampled frames (microseconds)',
+    LATENCY_BUCKETS_US,
+)
+shadow_latency_histogram = Histogram(
+    'handsign_shadow_latency_us', 'Per-frame latency of the shadow hand sign backend on shadow-sampled frames (microseconds)',
+    LATENCY_BUCKETS_US,
+)
+shadow_frames_total = Counter('handsign_shadow_frames_total', 'Frames compared between the primary and shadow backends')
+shadow_agreements_total = Counter('handsign_shadow_agreements_total', 'Compared frames where both backends predicted the same label')
+shadow_skipped_total = Counter('handsign_shadow_skipped_total', 'Sampled frames skipped because the shadow backend was busy')
+shadow_errors_total = Counter('handsign_shadow_errors_total', 'Shadow backend calls that raised an error')
+shadow_agreement_ratio = Gauge(
+    'handsign_shadow_agreement_ratio', 'Share of compared frames where both backends predicted the same label',
+    fn=lambda: shadow_agreements_total.value / max(1, shadow_frames_total.value),
+)
+
+
+class ShadowEvaluator:
+    """
+    Wraps the primary backend's predict_batch and runs a candidate backend on a
+    sampled fraction of live frames. The candidate runs on its own thread after
+    the primary has answered, and its results are only recorded (latency and
+    label agreement), never returned. When the candidate falls behind, sampled
+    frames are skipped rather than queued.
+
+    For comparable latencies both backends are timed on the shadow thread over
+    the same sampled frames, the primary right before the candidate.
+    """
+
+    def __init__(self, primary: HandSignBackend, candidate: HandSignBackend, sample_rate: float = 0.05,
+                 max_pending: int = 4, verbose: bool = True):
+        self.primary = primary
+        self.candidate = candidate
+        self.sample_rate = min(max(sample_rate, 0.0), 1.0)
+        self.max_pending = max(1, max_pending)
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="handsign-shadow")
+        self._pending = 0
+        self._lock = threading.Lock()
+        log_info(f"Shadow evaluation of '{candidate.name}' against '{primary.name}' on "
+                 f"{self.sample_rate:.1%} of frames", verbose)
+
+    def predict_batch(self, frames: list) -> list[HandSignPrediction | None]:
+        results = self.primary.predict_batch(frames)
+        sampled = [i for i in range(len(frames)) if random.random() < self.sample_rate]
+        if sampled:
+            with self._lock:
+                busy = self._pending >= self.max_pending
+                if not busy:
+                    self._pending += 1
+            if busy:
+                shadow_skipped_total.inc(len(sampled))
+            else:
+                self._pool.submit(self._evaluate, [frames[i] for i in sampled], [results[i] for i in sampled])
+        return results
+
+    def _evaluate(self, frames: list, primary_results: list[HandSignPrediction | None]):
+        try:
+            start = time.perf_counter()
+            self.primary.predict_batch(frames)
+            primary_done = time.perf_counter()
+            candidate_results = self.candidate.predict_batch(frames)
+            primary_latency_histogram.observe((primary_done - start) * 1e6 / len(frames))
+            shadow_latency_histogram.observe((time.perf_counter() - primary_done) * 1e6 / len(frames))
+            for primary, candidate in zip(primary_results, candidate_results):
+                if primary is None or candidate is None:
+                    continue
+                shadow_frames_total.inc()
+                if primary.label == candidate.label:
+                    shadow_agreements_total.inc()
+        except Exception as e:
+            shadow_errors_total.inc()
+            log_error(f"Shadow hand sign backend '{self.candidate.name}' failed: {e}")
+        finally:
+            with self._lock:
+                self._pending -= 1
@@ -0,0 +1,144 @@
+import os
+import time
+from dataclasses import dataclass, replace
+
+import numpy as np
+
+SMOOTHING_METHODS = ('none', 'ema', 'vote')
+EMIT_MODES = ('all', 'change')
+
+
+@dataclass(frozen=True)
+class SmoothingConfig:
+    method: str = 'none'   # 'none' (raw frame), 'ema' (exponential moving average) or 'vote' (majority vote)
+    window: int = 5        # Number of recent probability vectors kept per session
+    alpha: float = 0.5     # EMA weight of the newest frame
+    emit: str = 'all'      # 'all' emits every confident frame, 'change' only when the stabilized letter changes
+    hold_ms: float = 0     # With emit='change', re-emit an unchanged letter after this long (0 = never)
+
+    def validated(self) -> 'SmoothingConfig':
+        if self.method not in SMOOTHING_METHODS:
+            raise ValueError(f"method must be one of {SMOOTHING_METHODS}, got '{self.method}'")
+        if self.emit not in EMIT_MODES:
+            raise ValueError(f"emit must be one of {EMIT_MODES}, got '{self.emit}'")
+        if not 1 <= self.window <= 120:
+            raise ValueError(f"window must be between 1 and 120, got {self.window}")
+        if not 0 < self.alpha <= 1:
+            raise ValueError(f"alpha must be in (0, 1], got {self.alpha}")
+        if self.hold_ms < 0:
+            raise ValueError(f"hold_ms must not be negative, got {self.hold_ms}")
+        return self
+
+    def updated(self, params: dict) -> 'SmoothingConfig':
+        """Return a copy with the given client parameters applied. Raises ValueError on invalid input."""
+        unknown = set(params) - set(self.__dataclass_fields__)
+        if unknown:
+            raise ValueError(f"unknown smoothing parameters: {sorted(unknown)}")
+        types = {'method': str, 'window': int, 'alpha': float, 'emit': str, 'hold_ms': float}
+        try:
+            converted = {key: types[key](value) for key, value in params.items()}
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"invalid smoothing parameter: {e}")
+        return replace(self, **converted).validated()
+
+    def as_dict(self) -> dict:
+        return {key: getattr(self, key) for key in self.__dataclass_fields__}
+
+
+def default_smoothing_config() -> SmoothingConfig:
+    """Server-wide defaults from the environment; sessions may override them."""
+    return SmoothingConfig(
+        method=os.getenv("HANDSIGN_SMOOTHING", "none"),
+        window=int(os.getenv("HANDSIGN_SMOOTHING_WINDOW", "5")),
+        alpha=float(os.getenv("HANDSIGN_SMOOTHING_ALPHA", "0.5")),
+        emit=os.getenv("HANDSIGN_EMIT", "all"),
+        hold_ms=float(os.getenv("HANDSIGN_HOLD_MS", "0")),
+    ).validated()
+
+
+class HandSignSmoother:
+    """
+    Stateful per-session decoder for hand sign predictions. Keeps a ring buffer
+    of the most recent probability vectors, stabilizes them with an EMA or a
+    majority vote, and decides whether the result should be emitted.
+    """
+
+    def __init__(self, labels: list[str], config: SmoothingConfig):
+        self.labels = labels
+        self.config = config
+        self._history = np.zeros((config.window, len(labels)), dtype=np.float32)
+        self._size = 0
+        self._next = 0
+        self._ema: np.ndarray | None = None
+        self._last_label: str | None = None
+        self._last_emit = 0.0
+
+    def _stabilize(self, probs: np.ndarray) -> tuple[str, float]:
+        method = self.config.method
+        if method == 'ema':
+            if self._ema is None:
+                self._ema = probs.astype(np.float32)
+            else:
+                self._ema = self.config.alpha * probs + (1 - self.config.alpha) * self._ema
+            index = int(np.argmax(self._ema))
+            return self.labels[index], float(self._ema[index])
+        if method == 'vote':
+            recent = self._history[:self._size]
+            votes = np.bincount(np.argmax(recent, axis=1), minlength=len(self.labels))
+            index = int(np.argmax(votes))
+            # Confidence of the winner: its mean probability over the window
+            return self.labels[index], float(recent[:, index].mean())
+        index = int(np.argmax(probs))
+        return self.labels[index], float(probs[index])
+
+    def update(self, probs: np.ndarray, min_confidence: float, now: float | None = None) -> tuple[str, float] | None:
+        """
+        Add one frame's probability vector. Returns the stabilized (label, prob)
+        if it should be emitted to the client, otherwise None.
+        """
+        now = time.monotonic() if now is None else now
+        self._history[self._next] = probs
+        self._next = (self._next + 1) % len(self._history)
+        self._size = min(self._size + 1, len(self._history))
+
+        label, prob = self._stabilize(probs)
+        if prob < min_confidence:
+            # Not confident: stay silent, but keep the last emitted letter so a brief dip does not re-emit it
+            return None
+
+        if self.config.emit == 'change':
+            changed = label != self._last_label
+            held = self.config.hold_ms > 0 and (now - self._last_emit) * 1000 >= self.config.hold_ms
+            if not changed and not held:
+                return None
+        self._last_label = label
+        self._last_emit = now
+        return label, prob
+
+
+class SmootherRegistry:
+    """Per-session smoothers and their parameters, created lazily and freed on disconnect."""
+
+    def __init__(self, labels: list[str], default_config: SmoothingConfig):
+        self.labels = labels
+        self.default_config = default_config
+        self._configs: dict[str, SmoothingConfig] = {}
+        self._smoothers: dict[str, HandSignSmoother] = {}
+
+    def get(self, sid: str) -> HandSignSmoother:
+        smoother = self._smoothers.get(sid)
+        if smoother is None:
+            config = self._configs.get(sid, self.default_config)
+            smoother = self._smoothers[sid] = HandSignSmoother(self.labels, config)
+        return smoother
+
+    def configure(self, sid: str, params: dict) -> SmoothingConfig:
+        """Apply client parameters to the session and reset its history. Raises ValueError on invalid input."""
+        config = self._configs.get(sid, self.default_config).updated(params)
+        self._configs[sid] = config
+        self._smoothers.pop(sid, None)
+        return config
+
+    def forget(self, sid: str):
+        self._configs.pop(sid, None)
+        self._smoothers.pop(sid, None)
@@ -1,24 +1,181 @@
+import atexit
 import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
 
-def _get_timestamp():
-    return datetime.datetime.now().isoformat()
+from metrics import Counter
 
-def log_info(message: str, verbose: bool = True):
+# Logging is configured from the environment:
+#   LOG_LEVEL         DEBUG | INFO | WARNING | ERROR (default INFO)
+#   LOG_FORMAT        text | json (default text: "[timestamp] LEVEL: message")
+#   LOG_QUEUE_SIZE    records buffered for the writer thread; further records are dropped (default 10000)
+#   LOG_MESSAGE_RATE  received/sent message records and per-frame records, per second and per event; excess is
+#                     sampled out (0 = no limit)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_MESSAGE_RATE = float(os.getenv("LOG_MESSAGE_RATE", "10"))
+
+log_records_dropped_total = Counter('log_records_dropped_total', 'Log records dropped because the log queue was full')
+log_records_sampled_out_total = Counter(
+    'log_records_sampled_out_total', 'Message and per-frame log records skipped by per-event rate limiting',
+)
+
+
+class _Tail:
+    """Last characters of str(data), computed only if the record is actually written."""
+    __slots__ = ('data', 'length')
+
+    def __init__(self, data, length: int = 100):
+        self.data = data
+        self.length = length
+
+    def __str__(self) -> str:
+        return str(self.data)[-self.length:]
+
+
+class _TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        timestamp = datetime.datetime.fromtimestamp(record.created).isoformat()
+        line = f"[{timestamp}] {record.levelname}: {record.getMessage()}"
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            line += f" (+{suppressed} similar suppressed)"
+        return line
+
+
+class _JsonFormatter(logging.Formatter):
+    # Structured fields callers may attach through `extra`
+    FIELDS = ('sid', 'event', 'direction', 'suppressed')
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created).isoformat(),
+            'level': record.levelname,
+            'msg': record.getMessage(),
+            'thread': record.threadName,
+        }
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value:
+                entry[field] = value
+        data = getattr(record, 'data', None)
+        if data is not None:
+            entry['data'] = str(data)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _BoundedQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the writer thread without formatting them and drops them when the queue is full."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The default implementation formats the message here, on the calling thread
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped_total.inc()
+
+
+class _EventSampler:
+    """Token bucket per event name: at most `rate` records per second, with bursts up to one second's worth."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._buckets: dict[str, list[float]] = {}  # event -> [tokens, last refill, suppressed since last record]
+        self._lock = threading.Lock()
+
+    def allow(self, event: str) -> tuple[bool, int]:
+        """Return (allowed, records suppressed since the last allowed one)."""
+        if self.rate <= 0:
+            return True, 0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(event)
+            if bucket is None:
+                bucket = self._buckets[event] = [self.rate, now, 0]
+            bucket[0] = min(self.rate, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                log_records_sampled_out_total.inc()
+                return False, 0
+            bucket[0] -= 1
+            suppressed, bucket[2] = int(bucket[2]), 0
+            return True, suppressed
+
+
+def _configure_logger() -> logging.Logger:
+    logger = logging.getLogger("isle.ml")
+    logger.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+    logger.propagate = False
+
+    records = queue.Queue(maxsize=max(1, LOG_QUEUE_SIZE))
+    logger.addHandler(_BoundedQueueHandler(records))
+
+    # A single background thread formats and writes every record
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(_JsonFormatter() if LOG_FORMAT == "json" else _TextFormatter())
+    listener = logging.handlers.QueueListener(records, output)
+    listener.start()
+
+    def flush_on_exit():
+        try:
+            listener.stop()
+        except queue.Full:
+            pass
+    atexit.register(flush_on_exit)
+    return logger
+
+
+_logger = _configure_logger()
+_message_sampler = _EventSampler(LOG_MESSAGE_RATE)
+
+
+def _log(level: int, message: str, sample: str | None, sid: str | None):
+    if sample is None:
+        _logger.log(level, message)
+        return
+    # Records that can repeat for every frame are rate-limited per kind, like message records
+    if not _logger.isEnabledFor(level):
+        return
+    allowed, suppressed = _message_sampler.allow(f"{logging.getLevelName(level).lower()}:{sample}")
+    if allowed:
+        _logger.log(level, message, extra={'sid': sid, 'event': sample, 'suppressed': suppressed})
+
+def log_info(message: str, verbose: bool = True, sample: str | None = None, sid: str | None = None):
     if verbose:
-        print(f"[{_get_timestamp()}] INFO: {message}")
+        _log(logging.INFO, message, sample, sid)
 
-def log_warning(message: str, verbose: bool = True):
+def log_warning(message: str, verbose: bool = True, sample: str | None = None, sid: str | None = None):
     if verbose:
-        print(f"[{_get_timestamp()}] WARNING: {message}")
+        _log(logging.WARNING, message, sample, sid)
 
-def log_error(message: str, verbose: bool = True):
+def log_error(message: str, verbose: bool = True, sample: str | None = None, sid: str | None = None):
     if verbose:
-        print(f"[{_get_timestamp()}] ERROR: {message}")
+        _log(logging.ERROR, message, sample, sid)
+
+def _log_message(direction: str, template: str, sid: str, event: str, data: any):
+    if not _logger.isEnabledFor(logging.INFO):
+        return
+    allowed, suppressed = _message_sampler.allow(f"{direction}:{event}")
+    if allowed:
+        payload = _Tail(data)
+        _logger.info(template, sid, event, payload,
+                     extra={'sid': sid, 'event': event, 'direction': direction, 'data': payload, 'suppressed': suppressed})
 
 def log_received_message(sid: str, event: str, data: any, verbose: bool = True):
     if verbose:
-        log_info(f"Client {sid} | Event '{event}' | Data: {str(data)[-100:]}")
+        _log_message('received', "Client %s | Event '%s' | Data: %s", sid, event, data)
 
 def log_sending_message(sid: str, event: str, data: any, verbose: bool = True):
     if verbose:
-        log_info(f"To {sid} | Event '{event}' | Data: {str(data)[-100:]}") 
\ No newline at end of file
+        _log_message('sent', "To %s | Event '%s' | Data: %s", sid, event, data)
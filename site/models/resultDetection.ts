@@ -29,6 +29,8 @@ export interface HandSignResponse {
   pred: string;    // Prediction result
   prob: number;    // Probability
   infer: number;   // Inference time (in ms)
+  dropped?: number; // Frames from this session dropped server-side in favour of newer ones
+  frame?: number;   // Id of the request frame this response answers (echoed from req_handsign)
 }
 
 /**
@@ -68,4 +70,27 @@ export function formatLandmarksForWebSocket(landmarks: MediaPipeLandmarks): { la
     console.error('Error formatting landmarks for WebSocket:', error);
     return null;
   }
-} 
\ No newline at end of file
+} 
+
+/**
+ * Pack hand landmarks from MediaPipe into a compact binary frame for the WebSocket API.
+ * The frame holds 63 little-endian float32 values, landmark by landmark (x0, y0, z0, x1, ...),
+ * and is sent as a socket.io binary attachment instead of a list of JSON objects.
+ * @param landmarks Array of hand landmarks from MediaPipe
+ * @returns Object with the packed landmarks, or null if there are not exactly 21 landmarks
+ */
+export function packLandmarksForWebSocket(landmarks: MediaPipeLandmarks): { landmarks: ArrayBuffer } | null {
+  const formatted = formatLandmarksForWebSocket(landmarks);
+  if (!formatted || formatted.landmarks.length !== 21) {
+    return null;
+  }
+
+  const buffer = new ArrayBuffer(21 * 3 * 4);
+  const view = new DataView(buffer);
+  formatted.landmarks.forEach((landmark, i) => {
+    view.setFloat32((i * 3) * 4, landmark.x, true);
+    view.setFloat32((i * 3 + 1) * 4, landmark.y, true);
+    view.setFloat32((i * 3 + 2) * 4, landmark.z, true);
+  });
+  return { landmarks: buffer };
+}
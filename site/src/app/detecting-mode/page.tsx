@@ -1,5 +1,5 @@
 'use client';
-import { useState, useCallback, useEffect } from 'react';
+import { useState, useCallback, useEffect, useRef } from 'react';
 import React from "react";
 import { X, ArrowRight, Trash2, Delete } from "lucide-react";
 import Navbar from "../../components/navbar";
@@ -28,6 +28,10 @@ const DetectingModePage = () => {
     const [isLoadingSuggestions, setIsLoadingSuggestions] = useState(false);
     const [selectedSuggestionIndex, setSelectedSuggestionIndex] = useState(-1);
     const [inlineSuggestion, setInlineSuggestion] = useState<string>("");
+    // Characters at the end of the text the suggestions replace (corrections of a misrecognized word)
+    const [replaceCount, setReplaceCount] = useState(0);
+    // Text of the latest autocomplete request; responses computed for older text are ignored
+    const requestedTextRef = useRef<string>("");
     
     // State for consecutive detection
     const [lastDetectedChar, setLastDetectedChar] = useState<string | null>(null);
@@ -37,7 +41,8 @@ const DetectingModePage = () => {
     useEffect(() => {
         if (currentUserText.trim()) {
             setIsLoadingSuggestions(true);
-            socket.emit('req_autocomp', { text: currentUserText.toLowerCase() });
+            requestedTextRef.current = currentUserText.toLowerCase();
+            socket.emit('req_autocomp', { text: requestedTextRef.current, fuzzy: true });
             setInlineSuggestion("");
         } else {
             setSuggestions([]);
@@ -47,10 +52,14 @@ const DetectingModePage = () => {
 
     // Listen for autocomplete suggestions from the server
     useEffect(() => {
-        const handleAutocompResponse = (data: { suggestions: string[] }) => {
+        const handleAutocompResponse = (data: { suggestions: string[], text?: string, replace?: number }) => {
+            if (data && typeof data.text === 'string' && data.text !== requestedTextRef.current) {
+                return; // Stale: computed for text that has changed since
+            }
             setIsLoadingSuggestions(false);
             if (data && Array.isArray(data.suggestions) && data.suggestions.length > 0) {
                 setSuggestions(data.suggestions);
+                setReplaceCount(data.replace ?? 0);
                 // Set the first suggestion as the inline suggestion
                 if (data.suggestions[0]) {
                     setInlineSuggestion(data.suggestions[0]);
@@ -69,16 +78,21 @@ const DetectingModePage = () => {
 
     // Handle suggestion selection
     const selectSuggestion = useCallback((suggestion: string) => {
-        setCurrentUserText(currentText => (currentText.toLowerCase() + suggestion + " ").replace("  ", " "));
+        setCurrentUserText(currentText => {
+            const base = currentText.toLowerCase();
+            return (base.slice(0, base.length - replaceCount) + suggestion + " ").replace("  ", " ");
+        });
         setSuggestions([]);
         setInlineSuggestion("");
+        setReplaceCount(0);
         setSelectedSuggestionIndex(-1);
-    }, []);
+    }, [replaceCount]);
 
     const clearText = useCallback(() => {
         setCurrentUserText("");
         setSuggestions([]);
         setInlineSuggestion("");
+        setReplaceCount(0);
         setSelectedSuggestionIndex(-1);
     }, []);
 
@@ -241,7 +255,9 @@ const DetectingModePage = () => {
                                                 <div>
                                                     <span className="text-gray-900 dark:text-gray-100">{currentUserText.toLowerCase()}</span>
                                                     {inlineSuggestion && (
-                                                        <span className="text-gray-400 dark:text-gray-500">{inlineSuggestion}</span>
+                                                        <span className="text-gray-400 dark:text-gray-500">
+                                                            {replaceCount > 0 ? ` \u2192 ${inlineSuggestion}` : inlineSuggestion}
+                                                        </span>
                                                     )}
                                                 </div>
                                             ) : (
@@ -261,7 +277,7 @@ const DetectingModePage = () => {
                                                             onMouseEnter={() => setSelectedSuggestionIndex(index)}
                                                         >
                                                             <div>
-                                                                <span>{currentUserText.toLowerCase()}</span>
+                                                                <span>{currentUserText.toLowerCase().slice(0, currentUserText.length - replaceCount)}</span>
                                                                 <span className="font-bold">{suggestion}</span>
                                                             </div>
                                                             {selectedSuggestionIndex === index && (
@@ -14,7 +14,7 @@ import {
 } from "models/wsEventListener";
 import {
     HandSignResponse,
-    formatLandmarksForWebSocket,
+    packLandmarksForWebSocket,
     MediaPipeLandmarks
 } from "models/resultDetection";
 
@@ -50,6 +50,9 @@ export const useHandDetection = ({
     // Processing state
     const [isProcessingLandmarks, setIsProcessingLandmarks] = useState(false);
     const lastProcessTimeRef = useRef(0);
+    // Monotonic id of the frames we send, and the newest frame answered so far
+    const nextFrameIdRef = useRef(0);
+    const lastAnsweredFrameRef = useRef(-1);
 
     // Subscribe to WebSocket connection state changes
     useEffect(() => {
@@ -64,6 +67,13 @@ export const useHandDetection = ({
     // Handle WebSocket responses
     useEffect(() => {
         const handleHandsignResponse = (data: HandSignResponse) => {
+            // Ignore answers to frames older than one we already have a result for
+            if (data && typeof data.frame === 'number') {
+                if (data.frame <= lastAnsweredFrameRef.current) {
+                    return;
+                }
+                lastAnsweredFrameRef.current = data.frame;
+            }
             if (data && data.pred) {
                 setDetectionData(data);
                 onDetectionResult(data.pred, data);
@@ -80,9 +90,9 @@ export const useHandDetection = ({
             console.log("Not connected to WebSocket. Cannot send landmarks.");
             return;
         }
-        const formattedData = formatLandmarksForWebSocket(landmarks);
+        const formattedData = packLandmarksForWebSocket(landmarks);
         if (formattedData) {
-            socket.emit('req_handsign', formattedData);
+            socket.emit('req_handsign', { ...formattedData, frame: nextFrameIdRef.current++ });
         } else {
             console.log("Failed to format landmarks for WebSocket.");
         }